@@ -1,12 +1,21 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import sympy as sym
 from sympy import Piecewise
 import matplotlib.pyplot as plt
-from scipy.interpolate import BSpline as SciPyBSpline, CubicSpline as SciPyCubicSpline
+from scipy.interpolate import BSpline as SciPyBSpline, CubicSpline as SciPyCubicSpline, PPoly
 from typing import Callable, List
+from fractions import Fraction
 from functools import lru_cache
-from scipy.linalg import solve
+from math import comb
+from scipy.linalg import qr, solve, solve_banded, solve_triangular
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
 from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 (needed for 3-D proj)
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error, median_absolute_error
 
@@ -724,19 +733,31 @@ class CubicClosedSpline(Spline):
 	с интерфейсом fit, predict, get_basis_functions.
 	"""
 
-	def __init__(self, lam: float, sigma: np.ndarray = None):
+	def __init__(self, lam: float = 1.0, sigma: np.ndarray = None, periodic: bool = False):
+		"""
+		lam: параметр сглаживания (0 < lam <= 1)
+		sigma: веса (стандартные отклонения)
+		periodic: строить замкнутый (периодический) сплайн
+		"""
 		self.x = None
 		self.y = None
 		self.sigma = sigma
 		self.lam = lam
-		self.segments = None  # Список сегментов с коэффициентами a, b, c, d
+		self.periodic = periodic
+		self.period = None
+		self.breakpoints = None  # Узлы кусочно-полиномиального представления
+		self.coeffs = None  # Таблица коэффициентов формы (4, n): строки a, b, c, d
+		self._ppoly = None
 
-	def fit(self, x, y, sigma=None, lam=1.0):
+	def fit(self, x, y, sigma=None, lam=None):
 		"""
 		Обучение сглаживающего кубического сплайна.
 		x, y - данные
-		sigma - веса (стандартные отклонения), если None, то все веса = 1
-		lam - параметр сглаживания (0 < lam <= 1)
+		sigma - веса (стандартные отклонения); если None, берутся заданные в конструкторе, а без них все веса = 1
+		lam - параметр сглаживания (0 < lam <= 1); если None, берется заданный в конструкторе
+
+		В периодическом режиме последняя точка замыкает контур (как в SciPy, bc_type='periodic'):
+		x[-1] = x[0] + T, где T - период, и y[-1] должно совпадать с y[0].
 		"""
 		x = np.asarray(x)
 		y = np.asarray(y)
@@ -744,29 +765,25 @@ class CubicClosedSpline(Spline):
 		if N < 3:
 			raise ValueError(
 				"Должно быть не менее 3 узлов для построения сплайна.")
-		if sigma is None:
+		# Параметры, явно переданные в fit, заменяют заданные в конструкторе
+		if sigma is not None:
+			self.sigma = sigma
+		if lam is not None:
+			self.lam = lam
+		lam = self.lam
+		if self.sigma is None:
 			sigma = np.ones_like(x)
 		else:
-			sigma = np.asarray(sigma)
+			sigma = np.asarray(self.sigma)
+			if sigma.shape != x.shape:
+				raise ValueError("Размер sigma должен совпадать с количеством узлов.")
 		n = N - 1
-		# Сохраняем параметры
 		self.x = x
 		self.y = y
-		self.sigma = sigma
-		self.lam = lam
-
-		# Структура сегмента
 
-		class SplineSegment:
-			def __init__(self, x, y):
-				self.x = x  # узловое значение x
-				self.y = y  # наблюдаемое значение y (из данных)
-				self.a = 0.0  # коэффициент при (x - x_i)^3
-				self.b = 0.0  # коэффициент при (x - x_i)^2
-				self.c = 0.0  # коэффициент при (x - x_i)
-				self.d = 0.0  # свободный член (значение функции в узле)
+		if self.periodic:
+			return self.__fit_periodic(x, y, sigma, lam)
 
-		S = [SplineSegment(x[i], y[i]) for i in range(N)]
 		h = np.zeros(n)
 		r = np.zeros(n + 1)
 		f = np.zeros(n + 1)
@@ -775,15 +792,15 @@ class CubicClosedSpline(Spline):
 		u = np.zeros(n + 2)
 		v = np.zeros(n + 2)
 		w = np.zeros(n + 2)
-		h[0] = S[1].x - S[0].x
+		h[0] = x[1] - x[0]
 		r[0] = 3.0 / h[0]
 		for i in range(1, n):
-			h[i] = S[i + 1].x - S[i].x
+			h[i] = x[i + 1] - x[i]
 			r[i] = 3.0 / h[i]
 			f[i] = - (r[i - 1] + r[i])
-			p[i] = 2.0 * (S[i + 1].x - S[i - 1].x)
-			q[i] = 3.0 * (S[i + 1].y - S[i].y) / h[i] - \
-				   3.0 * (S[i].y - S[i - 1].y) / h[i - 1]
+			p[i] = 2.0 * (x[i + 1] - x[i - 1])
+			q[i] = 3.0 * (y[i + 1] - y[i]) / h[i] - \
+				   3.0 * (y[i] - y[i - 1]) / h[i - 1]
 		r[n] = 0.0
 		f[0] = 0.0
 		f[n] = 0.0
@@ -834,56 +851,156 @@ class CubicClosedSpline(Spline):
 				q[j] = q[j] - v[j] * q[j + 1] - w[j] * q[j + 2]
 
 		quincunx(u, v, w, Q, n)
-		# Восстанавливаем параметры сплайна
-		S[0].d = S[0].y - mu * r[0] * Q[1] * sigma[0]
-		if n > 0:
-			S[1].d = S[1].y - mu * (f[1] * Q[1] + r[1] * Q[2]) * sigma[1]
-			S[0].a = Q[1] / (3.0 * h[0])
-			S[0].b = 0.0
-			S[0].c = (S[1].d - S[0].d) / h[0] - Q[1] * h[0] / 3.0
+		# Восстанавливаем параметры сплайна: на i-м интервале a (x - x_i)^3 + b (x - x_i)^2 + c (x - x_i) + d
+		a, b, c, d = np.zeros((4, n))
+		d[0] = y[0] - mu * r[0] * Q[1] * sigma[0]
+		d[1] = y[1] - mu * (f[1] * Q[1] + r[1] * Q[2]) * sigma[1]
+		a[0] = Q[1] / (3.0 * h[0])
+		c[0] = (d[1] - d[0]) / h[0] - Q[1] * h[0] / 3.0
 		r[0] = 0.0
 		for j in range(1, n):
-			S[j].a = (Q[j + 1] - Q[j]) / (3.0 * h[j])
-			S[j].b = Q[j]
-			S[j].c = (Q[j] + Q[j - 1]) * h[j - 1] + S[j - 1].c
+			a[j] = (Q[j + 1] - Q[j]) / (3.0 * h[j])
+			b[j] = Q[j]
+			c[j] = (Q[j] + Q[j - 1]) * h[j - 1] + c[j - 1]
 			temp = (r[j - 1] * Q[j - 1] + f[j] * Q[j] + r[j] * Q[j + 1])
-			S[j].d = S[j].y - mu * temp * sigma[j]
-		S[-1].d = S[-1].y
-		S[-1].a = 0.0
-		S[-1].b = 0.0
-		S[-1].c = 0.0
-		self.segments = S
+			d[j] = y[j] - mu * temp * sigma[j]
+		self.__compile_table(x, np.vstack([a, b, c, d]))
+
+	def __fit_periodic(self, x, y, sigma, lam):
+		"""
+		Замкнутый сглаживающий сплайн: та же система (R + mu Q^T Σ Q) b = Q^T y,
+		что и в открытом случае, но с циклическими индексами узлов.
+		"""
+		N = len(x)
+		n = N - 1  # число различных узлов на периоде
+		if N < 4:
+			raise ValueError(
+				"Для замкнутого сплайна нужно не менее 3 различных узлов и замыкающая точка.")
+		if not np.isclose(y[0], y[-1]):
+			raise ValueError(
+				"Для замкнутого сплайна последняя точка должна замыкать контур: y[-1] == y[0].")
+
+		self.period = x[-1] - x[0]
+		h = np.diff(x).astype(float)
+		if np.any(h <= 0):
+			raise ValueError("Узлы x должны строго возрастать.")
+
+		y_c = np.asarray(y[:n], dtype=float)
+		s_c = np.asarray(sigma[:n], dtype=float)
+
+		# Все величины индексируются по модулю n: h[i] = x[i+1] - x[i], h[n-1] замыкает контур
+		r = 3.0 / h
+		r_prev = np.roll(r, 1)
+		f = -(r_prev + r)
+		p = 2.0 * (np.roll(h, 1) + h)
+		q = r_prev * np.roll(y_c, 1) + f * y_c + r * np.roll(y_c, -1)
+
+		mu = 2.0 * (1.0 - lam) / (3.0 * lam)
+		s_next = np.roll(s_c, -1)
+		u = mu * (r_prev ** 2 * np.roll(s_c, 1) + f ** 2 * s_c + r ** 2 * s_next) + p
+		v = mu * (f * r * s_c + r * np.roll(f, -1) * s_next) + h
+		w = mu * r * np.roll(r, -1) * s_next
+
+		b = self.__cyclic_pentadiagonal_solve(u, v, w, q)
+
+		# Восстанавливаем параметры сплайна
+		d = y_c - mu * s_c * (r_prev * np.roll(b, 1) + f * b + r * np.roll(b, -1))
+		b_next = np.roll(b, -1)
+		a = (b_next - b) / (3.0 * h)
+		c = (np.roll(d, -1) - d) / h - h * (2.0 * b + b_next) / 3.0
+
+		self.__compile_table(x, np.vstack([a, b, c, d]))
+
+	def __compile_table(self, breakpoints, coeffs):
+		"""
+		Сохраняет сплайн в виде непрерывных массивов (breakpoints, coeffs[4, n]) в формате SciPy PPoly:
+		coeffs[k, i] - коэффициент при (x - breakpoints[i])^(3 - k) на i-м интервале.
+		"""
+		self.breakpoints = np.ascontiguousarray(breakpoints, dtype=float)
+		self.coeffs = np.ascontiguousarray(coeffs, dtype=float)
+		self._ppoly = PPoly(self.coeffs, self.breakpoints,
+						   extrapolate='periodic' if self.periodic else True)
+
+	def get_coefficient_table(self):
+		"""
+		Возвращает кусочно-полиномиальное представление сплайна (breakpoints, coeffs),
+		которое можно передать в scipy.interpolate.PPoly(coeffs, breakpoints) или сохранить.
+		"""
+		if self.coeffs is None:
+			raise ValueError("Spline not fitted yet")
+		return self.breakpoints, self.coeffs
+
+	def to_ppoly(self) -> PPoly:
+		"""
+		Возвращает сплайн как scipy.interpolate.PPoly: вычисление, корни, производные
+		и интегралы выполняются в скомпилированном коде SciPy.
+		"""
+		if self._ppoly is None:
+			raise ValueError("Spline not fitted yet")
+		return self._ppoly
+
+	@staticmethod
+	def __cyclic_pentadiagonal_solve(u, v, w, q):
+		"""
+		Решает симметричную циклическую пятидиагональную систему M b = q за O(n).
+		u - главная диагональ, v и w - первая и вторая наддиагонали (v[n-1], w[n-2], w[n-1]
+		задают угловые элементы). Угловые элементы выносятся в поправку ранга 4:
+		M = A + U K U^T, где A - ленточная матрица, и по формуле Вудбери
+		M^-1 q = z - Z (I + K U^T Z)^-1 K U^T z, z = A^-1 q, Z = A^-1 U.
+		"""
+		n = len(u)
+		if n < 5:
+			# Угловые элементы перекрываются с лентой - решаем плотную систему
+			M = np.zeros((n, n))
+			idx = np.arange(n)
+			for k, diag in ((0, u), (1, v), (2, w)):
+				np.add.at(M, (idx, (idx + k) % n), diag)
+				if k:
+					np.add.at(M, ((idx + k) % n, idx), diag)
+			return solve(M, q)
+
+		# Ленточная часть в формате scipy.linalg.solve_banded с (l, u) = (2, 2)
+		ab = np.zeros((5, n))
+		ab[0, 2:] = w[:n - 2]
+		ab[1, 1:] = v[:n - 1]
+		ab[2, :] = u
+		ab[3, :-1] = v[:n - 1]
+		ab[4, :-2] = w[:n - 2]
+
+		# Угловой блок C (строки 0, 1; столбцы n-2, n-1) и K = [[0, C], [C^T, 0]]
+		C = np.array([[w[n - 2], v[n - 1]],
+					  [0.0, w[n - 1]]])
+		K = np.zeros((4, 4))
+		K[:2, 2:] = C
+		K[2:, :2] = C.T
+		rows = np.array([0, 1, n - 2, n - 1])
+		U = np.zeros((n, 4))
+		U[rows, np.arange(4)] = 1.0
+
+		# Один вызов ленточного решателя на все пять правых частей
+		sol = solve_banded((2, 2), ab, np.column_stack([q, U]))
+		z, Z = sol[:, 0], sol[:, 1:]
+
+		capacitance = np.eye(4) + K @ Z[rows]
+		return z - Z @ solve(capacitance, K @ z[rows])
 
 	def predict(self, x_new):
 		"""
 		Предсказание значений сплайна в точках x_new
 		"""
-		x_new = np.asarray(x_new)
-		y_new = np.zeros_like(x_new, dtype=float)
-		x = self.x
-		S = self.segments
-		for i, xq in enumerate(x_new):
-			# Находим сегмент
-			if xq <= x[0]:
-				seg = 0
-			elif xq >= x[-1]:
-				seg = len(S) - 2
-			else:
-				seg = np.searchsorted(x, xq) - 1
-			s = S[seg]
-			dx = xq - s.x
-			y_new[i] = s.d + dx * (s.c + dx * (s.b + dx * s.a))
-		return y_new
+		# Вне отрезка крайние кубики продолжаются, в периодическом режиме запросы переносятся на период
+		return self.to_ppoly()(np.asarray(x_new, dtype=float))
 
 	def get_basis_functions(self):
 		"""
-		Возвращает список функций-кубиков для каждого сегмента (a, b, c, d)
+		Возвращает список функций-кубиков для каждого интервала таблицы коэффициентов (a, b, c, d)
 		"""
+		breakpoints, coeffs = self.get_coefficient_table()
 		basis = []
-		for s in self.segments:
-			def f(x, s=s):
-				dx = x - s.x
-				return s.d + dx * (s.c + dx * (s.b + dx * s.a))
+		for x_i, (a, b, c, d) in zip(breakpoints, coeffs.T):
+			def f(x, x_i=x_i, a=a, b=b, c=c, d=d):
+				dx = x - x_i
+				return d + dx * (c + dx * (b + dx * a))
 
 			basis.append(f)
 		return basis
@@ -993,151 +1110,130 @@ class GeneralZSpline(Spline):
 		self.m = m
 		self.X = None
 		self.y = None
-		self.derivatives_at_points = []  # Массив матриц для вычисления производных в точках
+		self.derivatives_at_points = None  # Массив матриц для вычисления производных в точках
+		self.node_derivatives = None  # Коэффициенты Тейлора f^(p)(X_j) / p! в каждом узле
+		self.interval_coefficients = None  # Коэффициенты многочлена по степеням s = (x - X_j) / h_j на каждом интервале
 
 	def fit(self, x: np.ndarray, y: np.ndarray) -> None:
 		self.X = x
 		self.y = y
-		for i in range(len(self.X)):
-			self.derivatives_at_points.append(self._calculate_der_matrix(i))
-
-	def predict(self, x: np.ndarray) -> np.ndarray:
-		res = []
-		for i in range(len(x)):
-			res.append(self._val_at_x(x[i]))
-		return res
-
-	def get_basis_functions(self):
-		return None
+		if len(self.X) < 2 * self.m - 1:
+			raise ValueError(f"There should be at least {2 * self.m - 1} points for Z spline of order m={self.m}")
 
-	def _vandermonde_matrix_inverse(self, X_window: np.ndarray, idx_of_point: int) -> np.ndarray:
-		"""
-		Функция для вычисления обратной матрицы вандермонда по срезу массива координат по иксу
-		для точки с заданным индексом
-		X_window: срез массива координат по иксу
-		idx_of_point: точка для которой производятся вычисления
-		"""
-		V = np.zeros((2 * self.m - 1, 2 * self.m - 1))
-
-		for l in range(0, 2 * self.m - 1):
-			for p in range(0, 2 * self.m - 1):
-				V[l][p] = (X_window[l] - self.X[idx_of_point]) ** p
-
-		return np.linalg.inv(V)
-
-	def _points_left_right(self, idx_of_point: int) -> List[int]:
-		"""
-		Функция для вычисления среза массива координат по иксу
-		idx_of_point: точка для которой вычисляется срез
-		"""
-		amount_of_points_left = min(self.m - 1, idx_of_point)
-		amount_of_points_right = min(self.m - 1, len(self.X) - idx_of_point - 1)
+		windows = self._windows()
+		self.derivatives_at_points = self._vandermonde_inverses(windows)
 
-		if amount_of_points_right < amount_of_points_left:
-			amount_of_points_left += amount_of_points_left - amount_of_points_right
-		else:
-			amount_of_points_right = (self.m - 1 - amount_of_points_left) + self.m - 1
+		# Сумма y_i * Z_i в узле j затрагивает только точки окна j, поэтому
+		# свёртку с y можно выполнить один раз при обучении
+		y_windows = np.asarray(self.y, dtype=float)[windows]
+		self.node_derivatives = np.einsum('nij,nj->ni', self.derivatives_at_points, y_windows)
 
-		return [amount_of_points_left, amount_of_points_right]
+		# На интервале [X_j, X_j+1] сплайн - многочлен степени 2m-1 от s = (x - X_j) / h_j:
+		# sum_p h_j^p (D[j, p] * G0_p(s) + D[j+1, p] * G1_p(s)), где G0_p, G1_p не зависят от интервала
+		G0, G1 = GeneralZSpline._interval_basis(self.m)
+		h = np.diff(np.asarray(self.X, dtype=float))
+		h_pow = h[:, None] ** np.arange(self.m)
+		D = self.node_derivatives[:, :self.m]
+		self.interval_coefficients = (D[:-1] * h_pow) @ G0 + (D[1:] * h_pow) @ G1
 
-	def _calculate_der_matrix(self, idx_of_point: int) -> np.ndarray:
+	def predict(self, x: np.ndarray) -> np.ndarray:
 		"""
-		Функция для поиска матрицы для вычисления производной в точке
-		idx_of_point: индекс точки
+		Вычисление по заранее собранным коэффициентам интервалов: поиск интервала и схема Горнера
 		"""
-		window_bounds = self._points_left_right(idx_of_point)
-		der_window = self.X[(idx_of_point - window_bounds[0]):(idx_of_point + window_bounds[1] + 1)]
-
-		return self._vandermonde_matrix_inverse(der_window, idx_of_point)
-
-	def _lk(self, x: float, k: int, j: int) -> float:
-		return (x - self.X[j + 1]) / (self.X[j] - self.X[j + 1]) if k == 0 else (x - self.X[j]) / (
-					self.X[j + 1] - self.X[j])
-
-	def _l_0m_taylor(self, x: float, j: int, p: int) -> float:
-		res = 1
-		nom = 1
-		denom = 1
-
-		for i in range(1, self.m - p):
-			nom *= (self.m + i - 1) * (x - self.X[j]) * (-1)
-			denom *= i * (self.X[j] - self.X[j + 1])
-			res += nom / denom
-
-		return res
-
-	def _l_1m_taylor(self, x: float, j: int, p: int) -> float:
-		res = 1
-		nom = 1
-		denom = 1
-
-		for i in range(1, self.m - p):
-			nom *= (self.m + i - 1) * (x - self.X[j + 1])
-			denom *= i * (self.X[j] - self.X[j + 1])
-			res += nom / denom
+		x = np.asarray(x, dtype=float)
+		j = self._find_interval(x)
+		X = np.asarray(self.X, dtype=float)
+		s = (x - X[j]) / (X[j + 1] - X[j])
 
+		C = self.interval_coefficients
+		res = C[j, -1]
+		for k in range(C.shape[1] - 2, -1, -1):
+			res = res * s + C[j, k]
 		return res
 
-	def _B_p0(self, x: float, j: int, p: int) -> float:
-		return ((x - self.X[j]) ** p) * self._l_0m_taylor(x, j, p) * ((self._lk(x, 0, j) ** self.m) / factorial(p))
+	def get_basis_functions(self):
+		return None
 
-	def _B_p1(self, x: float, j: int, p: int) -> float:
-		return ((x - self.X[j + 1]) ** p) * self._l_1m_taylor(x, j, p) * ((self._lk(x, 1, j) ** self.m) / factorial(p))
+	@staticmethod
+	@lru_cache
+	def _interval_basis(m: int):
+		"""
+		Коэффициенты (по возрастанию степеней s) многочленов p! * B_p0 и p! * B_p1 на единичном интервале:
+		G0_p(s) = s^p * sum_i C(m+i-1, i) s^i * (1 - s)^m,
+		G1_p(s) = (s - 1)^p * sum_i C(m+i-1, i) (1 - s)^i * s^m,  i = 0..m-p-1
+		"""
+		P = np.polynomial.polynomial
+		G0 = np.zeros((m, 2 * m))
+		G1 = np.zeros((m, 2 * m))
+		for p in range(m):
+			S0 = np.zeros(1)
+			S1 = np.zeros(1)
+			for i in range(m - p):
+				binom = comb(m + i - 1, i)
+				S0 = P.polyadd(S0, P.polypow([0, 1], i) * binom)
+				S1 = P.polyadd(S1, P.polypow([1, -1], i) * binom)
+			g0 = P.polymul(P.polymul(P.polypow([0, 1], p), S0), P.polypow([1, -1], m))
+			g1 = P.polymul(P.polymul(P.polypow([-1, 1], p), S1), P.polypow([0, 1], m))
+			G0[p, :len(g0)] = g0
+			G1[p, :len(g1)] = g1
+		return G0, G1
+
+	def _windows(self) -> np.ndarray:
+		"""
+		Индексы окон из 2m-1 точек для всех узлов сразу
+		"""
+		n = len(self.X)
+		idx = np.arange(n)
+		left = np.minimum(self.m - 1, idx)
+		right = np.minimum(self.m - 1, n - idx - 1)
+		left = np.where(right < left, 2 * left - right, left)
+		return (idx - left)[:, None] + np.arange(2 * self.m - 1)
+
+	def _vandermonde_inverses(self, windows: np.ndarray) -> np.ndarray:
+		"""
+		Обратные матрицы Вандермонда V[l][p] = (X_window[l] - X[i]) ** p для всех узлов одним пакетным решением.
+		Смещения нормируются на масштаб окна: V = V_s * diag(scale^p), поэтому V^-1 = diag(scale^-p) * V_s^-1.
+		windows: индексы окон, полученные из _windows
+		"""
+		X = np.asarray(self.X, dtype=float)
+		n, size = windows.shape
+		powers = np.arange(size)
+		h = np.diff(X)
+
+		# Сравнение только относительное: разброс шагов против шага и погрешности округления самих узлов
+		if np.ptp(h) <= 1e-12 * abs(h[0]) + 8 * np.finfo(float).eps * np.abs(X).max():
+			# Равномерная сетка: нормированная матрица зависит только от положения узла в окне,
+			# поэтому все внутренние узлы используют одну и ту же закэшированную матрицу
+			left = np.arange(n) - windows[:, 0]
+			unit_inverses = GeneralZSpline._unit_vandermonde_inverses(self.m)
+			return unit_inverses[left] * (h[0] ** -powers)[None, :, None]
+
+		offsets = X[windows] - X[:, None]
+		scale = np.abs(offsets).max(axis=1)
+		scale[scale == 0] = 1.0  # m = 1: окно из одной точки
+		V = (offsets / scale[:, None])[:, :, None] ** powers
+		V_inv = np.linalg.solve(V, np.broadcast_to(np.eye(size), V.shape))
+		return V_inv * (scale[:, None] ** -powers)[:, :, None]
 
-	def _get_derivative_at_point(self, j: int, idx_of_zero: int) -> np.ndarray:
+	@staticmethod
+	@lru_cache
+	def _unit_vandermonde_inverses(m: int) -> np.ndarray:
 		"""
-		Функция для вычисления вектора из производных до m-1 порядка
-		j: индекс точки в которой вычисляется производная
-		idx_of_zero: индекс точки с которой ассоциирована базисная функция
+		Обратные матрицы Вандермонда для единичного шага сетки при всех положениях узла в окне (left = 0..2m-2)
 		"""
-		window = self._points_left_right(j)
-
-		if idx_of_zero < j - window[0] or j + window[1] < idx_of_zero:
-			return np.zeros(2 * self.m - 1)
-
-		y_der_j = np.zeros(2 * self.m - 1)
-		y_der_j[idx_of_zero - j + window[0]] = 1
-
-		return self.derivatives_at_points[j] @ y_der_j
+		size = 2 * m - 1
+		powers = np.arange(size)
+		offsets = np.arange(size)[None, :] - np.arange(size)[:, None]
+		V = offsets[:, :, None].astype(float) ** powers
+		V_inv = np.linalg.solve(V, np.broadcast_to(np.eye(size), V.shape))
+		V_inv.setflags(write=False)
+		return V_inv
 
-	def _Z(self, x: float, interval: int, idx_of_zero: int) -> float:
+	def _find_interval(self, x: np.ndarray) -> np.ndarray:
 		"""
-		Функция для вычисления значения базисного z-сплайна в точке при указанном интервале
-		x: точка, в которой вычисляется значение
-		interval: индекс точки в которой начинается интервал
-		idx_of_zero: точка, с которой ассоциирован базисный z-сплайн
+		Индексы интервалов [X_j, X_j+1] для точек x (точки вне отрезка относятся к крайним интервалам)
 		"""
-		res = 0
-
-		der_j = self._get_derivative_at_point(interval, idx_of_zero)
-		der_j_next = self._get_derivative_at_point(interval + 1, idx_of_zero)
-
-		for p in range(self.m):
-			res += factorial(p) * der_j[p] * self._B_p0(x, interval, p) + factorial(p) * der_j_next[p] * self._B_p1(x,
-																													interval,
-																													p)
-
-		return res
-
-	def _find_interval(self, x: float) -> int:
-		left = 0
-		right = len(self.X) - 1
-
-		while left < right:
-			mid = int(left + (right - left) * 0.5)
-			if self.X[mid] <= x:
-				left = mid + 1
-			else:
-				right = mid
-
-		return left - 1
-
-	def _val_at_x(self, x: float) -> float:
-		j = self._find_interval(x)
-		res = 0
-		for i in range(len(self.X)):
-			res += self.y[i] * self._Z(x, j, i)
-		return res
+		return np.clip(np.searchsorted(self.X, x, side='right') - 1, 0, len(self.X) - 2)
 
 	@staticmethod
 	def demo(m_values: List[int] = [1, 2, 3], num_points: int = 1000):
@@ -1170,15 +1266,33 @@ class GeneralZSpline(Spline):
 class CardinalZSpline(Spline):
 	"""
 	Кардинальный Z-сплайн с аналитическим построением через sympy.
+
+	Символьный вывод ядра Z_m дорогой, поэтому его результат - таблица коэффициентов многочленов
+	на интервалах [j, j+1], j = -m..m-1 - кэшируется в памяти процесса и на диске
+	(каталог SPLINES_CACHE_DIR, по умолчанию ~/.cache/splines).
 	"""
 
+	# Версия формата кэша: увеличивать при любом изменении вывода ядра
+	KERNEL_CACHE_VERSION = 1
+	_kernel_cache = {}
+
 	def __init__(self, m: int):
 		"""
 		m: порядок сплайна (например, 3 или 4)
 		f: функция, значения которой берутся в узлах [-m, ..., m-1]
 		"""
 		self.m = m
-		self.A = self.__finite_difference_matrix(m)
+		self.__A = None
+		self.kernel = None
+		self.interpolant = None  # Таблица коэффициентов интерполянта на интервалах [i, i+1], i = -2m..2m-2
+		self.base_function = None
+
+	@property
+	def A(self) -> List[List[float]]:
+		"""Матрица конечных разностей; вычисляется только при символьном выводе ядра"""
+		if self.__A is None:
+			self.__A = self.__finite_difference_matrix(self.m)
+		return self.__A
 
 	def fit(self, x: np.ndarray, y: np.ndarray) -> None:
 		"""Обучение сплайна на данных"""
@@ -1202,23 +1316,210 @@ class CardinalZSpline(Spline):
 			)
 
 		self.y_m = np.array(filtered_y)
-		self.base_function = sym.lambdify(sym.Symbol('x'), self.Z_m())
+		self.kernel = self.kernel_table()
+		self.base_function = self._evaluate_kernel
+
+		# На [i, i+1] каждый сдвиг Z_m(x - j) - строка таблицы ядра с номером i - j + m по той же
+		# переменной t = x - i, поэтому таблица интерполянта - дискретная свёртка y с таблицей ядра
+		self.interpolant = np.stack(
+			[np.convolve(self.y_m, self.kernel[:, p]) for p in range(2 * self.m)], axis=1)
 
 	def predict(self, x: np.ndarray) -> np.ndarray:
 		"""Предсказание значений сплайна в точках x"""
-		y_out = []
-		for x_i in x:
-			y_val = 0
-			for j in range(-self.m, self.m):
-				y_val += self.y_m[self.m + j] * self.base_function(x_i - j)
-			y_out.append(y_val)
-
-		return np.array(y_out)
+		return np.asarray(self._evaluate_piecewise(self.interpolant, -2 * self.m, x))
 
 	def get_basis_functions(self) -> List[Callable[[float], float]]:
 		"""Получение базисных функций сплайна"""
 		return [self.base_function]
 
+	def kernel_table(self) -> np.ndarray:
+		"""
+		Таблица коэффициентов ядра Z_m формы (2m, 2m): строка k - многочлен на интервале [j, j+1], j = k - m,
+		по возрастающим степеням t = x - j. Только первое обращение к данному m выполняет вывод через sympy.
+		"""
+		key = (self.KERNEL_CACHE_VERSION, self.m)
+		table = CardinalZSpline._kernel_cache.get(key)
+		if table is not None:
+			return table
+
+		path = self.__kernel_cache_path()
+		try:
+			table = np.load(path)
+		except (OSError, ValueError, EOFError):
+			table = None
+
+		if table is None or table.shape != (2 * self.m, 2 * self.m):
+			table = self.__symbolic_kernel_table()
+			try:
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+				tmp_path = f"{path}.{os.getpid()}.tmp"
+				with open(tmp_path, 'wb') as file:
+					np.save(file, table)
+				os.replace(tmp_path, path)
+			except OSError:
+				pass  # кэш на диске необязателен
+
+		table.setflags(write=False)
+		CardinalZSpline._kernel_cache[key] = table
+		return table
+
+	def __kernel_cache_path(self) -> str:
+		cache_dir = os.environ.get('SPLINES_CACHE_DIR',
+								   os.path.join(os.path.expanduser('~'), '.cache', 'splines'))
+		return os.path.join(cache_dir, f"z_kernel_v{self.KERNEL_CACHE_VERSION}_m{self.m}.npy")
+
+	def __symbolic_kernel_table(self) -> np.ndarray:
+		"""Вывод таблицы коэффициентов ядра через sympy"""
+		t = sym.Symbol('t')
+		table = np.zeros((2 * self.m, 2 * self.m))
+		for k, j in enumerate(range(-self.m, self.m)):
+			poly = sym.Poly(sym.expand(self.__Z_piece(t + j, j)), t)
+			coeffs = [float(c) for c in reversed(poly.all_coeffs())]
+			table[k, :len(coeffs)] = coeffs
+		return table
+
+	def resample(self, signal, ratio, chunk_size: int = 1 << 20, out: np.ndarray = None) -> np.ndarray:
+		"""
+		Интерполяция равномерно дискретизованного сигнала произвольной длины: ядро Z_m применяется как
+		скользящий КИХ-фильтр из 2m отводов, f(x) = sum_k signal[k] * Z_m(x - k), за пределами сигнала отсчёты равны 0.
+
+		signal: одномерный массив отсчётов; np.memmap читается по срезам без копирования всего сигнала
+		ratio: коэффициент передискретизации (int, float или Fraction), выходные точки x_q = q / ratio,
+			 q = 0..floor((len(signal) - 1) * ratio); float приводится к ближайшей дроби
+		chunk_size: число выходных отсчётов, обрабатываемых за один проход
+		out: необязательный выходной массив (например, np.memmap) длины floor((len(signal) - 1) * ratio) + 1
+		"""
+		n = len(signal)
+		if n == 0:
+			raise ValueError("Signal should not be empty")
+
+		up, down = self.__ratio_fraction(ratio)
+		n_out = (n - 1) * up // down + 1
+		if out is None:
+			out = np.empty(n_out)
+		elif out.shape != (n_out,):
+			raise ValueError(f"Output array should have shape ({n_out},)")
+
+		size = 2 * self.m
+		# Дробная часть принимает только up значений: при небольшом up веса всех фаз считаются один раз
+		phase_weights = self._tap_weights(np.arange(up) / up) if up <= chunk_size else None
+
+		for start in range(0, n_out, chunk_size):
+			stop = min(start + chunk_size, n_out)
+			# Целая и дробная части x_q = q * down / up без ошибок округления
+			num = np.arange(start, stop, dtype=np.int64) * down
+			i = num // up
+			phase = num % up
+			weights = phase_weights[phase] if phase_weights is not None else self._tap_weights(phase / up)
+
+			lo = int(i[0]) - self.m + 1
+			hi = int(i[-1]) + self.m + 1
+			block = np.asarray(signal[max(lo, 0):min(hi, n)], dtype=float)
+			if lo < 0 or hi > n:
+				block = np.pad(block, (max(0, -lo), max(0, hi - n)))
+			windows = sliding_window_view(block, size)
+			out[start:stop] = np.einsum('qk,qk->q', windows[i - i[0]], weights)
+
+		return out
+
+	def resample_nd(self, array, ratio, n_jobs: int = None) -> np.ndarray:
+		"""
+		Передискретизация N-мерного массива (изображения, объёма) тензорным произведением ядер Z_m:
+		одномерная интерполяция, как в resample, применяется по очереди вдоль каждой оси.
+
+		array: N-мерный массив на равномерной сетке; float32 сохраняется, остальные типы приводятся к float64
+		ratio: коэффициент передискретизации - общий для всех осей или последовательность по осям
+		n_jobs: число потоков; каждая ось обрабатывается параллельно по независимым слоям
+		"""
+		array = np.asarray(array)
+		dtype = np.float32 if array.dtype == np.float32 else np.float64
+		ratios = np.broadcast_to(np.asarray(ratio, dtype=object), (array.ndim,))
+
+		result = array.astype(dtype, copy=False)
+		for axis, axis_ratio in enumerate(ratios):
+			up, down = self.__ratio_fraction(axis_ratio)
+			if up == down:
+				continue  # Z_m интерполирует: в узлах значения не меняются
+			result = self.__resample_axis(result, axis, up, down, n_jobs)
+		return result
+
+	def __resample_axis(self, array: np.ndarray, axis: int, up: int, down: int, n_jobs: int = None) -> np.ndarray:
+		"""Один проход resample_nd вдоль оси axis"""
+		n = array.shape[axis]
+		n_out = (n - 1) * up // down + 1
+		num = np.arange(n_out, dtype=np.int64) * down
+		# Индексы отводов в массиве, дополненном m - 1 нулями слева и m нулями справа
+		rows = (num // up)[:, None] + np.arange(2 * self.m)
+		weights = self._tap_weights((num % up) / up).astype(array.dtype)
+
+		# Ось обработки - первая, остальные оси слиты в строки, которые копируются целиком
+		lines = np.moveaxis(array, axis, 0).reshape(n, -1)
+		padded = np.zeros((n + 2 * self.m - 1, lines.shape[1]), dtype=array.dtype)
+		padded[self.m - 1:self.m - 1 + n] = lines
+		out = np.empty((n_out, lines.shape[1]), dtype=array.dtype)
+
+		def run(columns):
+			acc = out[:, columns]
+			np.multiply(padded[rows[:, 0], columns], weights[:, :1], out=acc)
+			for k in range(1, 2 * self.m):
+				acc += padded[rows[:, k], columns] * weights[:, k:k + 1]
+
+		n_columns = lines.shape[1]
+		n_jobs = max(1, min(n_jobs or 1, n_columns))
+		bounds = np.linspace(0, n_columns, n_jobs + 1).astype(int)
+		slabs = [slice(bounds[i], bounds[i + 1]) for i in range(n_jobs)]
+		if n_jobs == 1:
+			run(slabs[0])
+		else:
+			with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+				list(pool.map(run, slabs))
+
+		shape = (n_out,) + np.moveaxis(array, axis, 0).shape[1:]
+		return np.moveaxis(out.reshape(shape), 0, axis)
+
+	def _tap_weights(self, t: np.ndarray) -> np.ndarray:
+		"""
+		Веса 2m отводов КИХ-фильтра для дробных частей t из [0, 1): отвод k = -m+1..m получает Z_m(t - k),
+		т.е. строку m - k таблицы ядра
+		"""
+		tap_table = self.kernel_table()[self.m - np.arange(-self.m + 1, self.m + 1)]
+		res = tap_table[:, -1] * t[:, None]
+		for p in range(2 * self.m - 2, 0, -1):
+			res = (res + tap_table[:, p]) * t[:, None]
+		return res + tap_table[:, 0]
+
+	@staticmethod
+	def __ratio_fraction(ratio):
+		"""Коэффициент передискретизации в виде несократимой дроби up / down"""
+		ratio = Fraction(ratio).limit_denominator(10 ** 6)
+		if ratio <= 0:
+			raise ValueError("Resampling ratio should be positive")
+		return ratio.numerator, ratio.denominator
+
+	def _evaluate_kernel(self, x):
+		"""Численное значение ядра Z_m(x) по таблице коэффициентов"""
+		return self._evaluate_piecewise(self.kernel, -self.m, x)
+
+	@staticmethod
+	def _evaluate_piecewise(table: np.ndarray, start: int, x):
+		"""
+		Векторное вычисление кусочного многочлена с целыми узлами: строка k таблицы - коэффициенты
+		по возрастающим степеням t = x - (start + k) на интервале [start + k, start + k + 1]; вне носителя 0.
+		"""
+		x = np.asarray(x, dtype=float)
+		n_pieces = len(table)
+		j = np.floor(x)
+		# Правый конец носителя относится к последнему интервалу
+		j = np.where(x == start + n_pieces, start + n_pieces - 1, j)
+		inside = (x >= start) & (x <= start + n_pieces)
+		k = np.clip(j - start, 0, n_pieces - 1).astype(int)
+		t = x - j
+
+		res = table[k, -1]
+		for p in range(table.shape[1] - 2, -1, -1):
+			res = res * t + table[k, p]
+		return np.where(inside, res, 0.0)[()]
+
 	def __finite_difference_matrix(self, m: int) -> List[List[float]]:
 		size = 2 * m - 1
 		V = [[(-(m - 1) + i) ** j for j in range(size)] for i in range(size)]
@@ -1265,14 +1566,18 @@ class CardinalZSpline(Spline):
 		x = sym.Symbol('x')
 		pieces = [(0, (x - shift < -self.m) | (x - shift > self.m))]
 		for j in range(-self.m, self.m):
-			z = sum(
-				self.__Z_p(p, j) * self.__B0(x - shift, p, j) +
-				self.__Z_p(p, j + 1) * self.__B1(x - shift, p, j)
-				for p in range(self.m)
-			)
+			z = self.__Z_piece(x - shift, j)
 			pieces.append((z, (x - shift >= j) & (x - shift <= j + 1)))
 		return Piecewise(*pieces)
 
+	def __Z_piece(self, x, j: int):
+		"""Символьное выражение Z_m на интервале [j, j+1]"""
+		return sum(
+			self.__Z_p(p, j) * self.__B0(x, p, j) +
+			self.__Z_p(p, j + 1) * self.__B1(x, p, j)
+			for p in range(self.m)
+		)
+
 	@staticmethod
 	def demo(m_values: List[int] = [1, 2, 3, 4, 5, 6], num_points: int = 1000):
 		"""
@@ -1290,7 +1595,7 @@ class CardinalZSpline(Spline):
 			spline.fit(x_nodes, y_nodes)
 
 			basis_function = spline.get_basis_functions()[0]
-			y_base = [basis_function(x) for x in x_vals]
+			y_base = basis_function(x_vals)
 
 			plt.plot(x_vals, y_base, label=f"Zₘ(x), m={m}")
 
@@ -1336,7 +1641,7 @@ class CardinalZSpline(Spline):
 
 		basis_function = spline.get_basis_functions()[0]
 		x_vals = np.linspace(-m - 1, m + 1, num_points)
-		y_vals = [basis_function(xi) for xi in x_vals]
+		y_vals = basis_function(x_vals)
 
 		plt.figure(figsize=figsize)
 		plt.plot(x_vals, y_vals, label=f'Zₘ(x), m={m}', color='blue')
@@ -1785,25 +2090,46 @@ class p_spline(spline):
 
 # b_spline
 class b_spline(spline):
-	def __init__(self, degree, control_points):
+	def __init__(self, degree, control_points, weights=None):
+		"""
+		Параметры:
+		- degree (int): Степень сплайна.
+		- control_points (array-like): Контрольные точки формы (n, dim).
+		- weights (array-like, optional): Веса контрольных точек (n,) для рациональной кривой (NURBS).
+		"""
 		self.control_points = control_points
 		self.degree = degree
+		self.weights = None
+		if weights is not None:
+			self.weights = np.asarray(weights, dtype=float)
+			if self.weights.shape != (len(control_points),):
+				raise ValueError("Число весов должно совпадать с числом контрольных точек.")
+			if np.any(self.weights <= 0):
+				raise ValueError("Веса контрольных точек должны быть положительными.")
 		super().__init__([], degree)
 		self.knots = self.generate_knots()  # Генерация узлового вектора
+		self._arc_table = None  # Таблица длины дуги (t, s), строится в arc_length_table
+		self._projection_index = None  # k-d дерево для closest_point, строится в build_projection_index
 
 	def generate_knots(self):
 		"""
 		Автоматическая генерация узлового вектора.
 		"""
-		n = len(self.control_points)  # Количество контрольных точек
-		m = n + self.degree + 1  # Количество узлов
-		knots = [0] * (self.degree + 1)  # Начальные узлы
+		return b_spline._knot_vector(len(self.control_points), self.degree)
+
+	@staticmethod
+	def _knot_vector(n, degree):
+		"""
+		Узловой вектор для n контрольных точек и степени degree.
+		"""
+		m = n + degree + 1  # Количество узлов
+		knots = [0] * (degree + 1)  # Начальные узлы
 
 		# Промежуточные узлы распределены
-		interior_knots = np.linspace(1, n - self.degree - 3, m - 2 * (self.degree + 1))  # degree - 1
-		# interior_knots = np.linspace(0, n - self.degree, m - 2 * (self.degree + 1))
+		interior_knots = np.linspace(1, n - degree - 3, m - 2 * (degree + 1))  # degree - 1
+		# interior_knots = np.linspace(0, n - degree, m - 2 * (degree + 1))
 		knots.extend(interior_knots)
-		knots.extend([n - self.degree - 1] * (self.degree + 1))  # Конечные узлы
+		knots.extend([n - degree - 1] * (degree + 1))  # Конечные узлы
 		return np.array(knots)
 
 	def basis_function(self, i, k, t):
@@ -1820,20 +2146,491 @@ class b_spline(spline):
 			return coeff1 + coeff2
 
 	def evaluate(self, t):
-		n = len(self.control_points) - 1
-		result = np.zeros((len(self.control_points[0]),))
+		"""
+		Вычисление точек кривой алгоритмом де Бура сразу для массива параметров t.
+		Для каждого t ищется промежуток узлов (searchsorted) и используются только k+1 активных контрольных точек.
+		Правый конец области параметра относится к последнему промежутку.
+
+		Возвращает:
+		- ndarray формы (dim,) для скалярного t или (len(t), dim) для массива
+		"""
+		t = np.asarray(t, dtype=float)
+		result = b_spline._de_boor(self.knots, self.degree, np.asarray(self.control_points, dtype=float),
+								   np.atleast_1d(t), self.weights)
+		return result[0] if t.ndim == 0 else result
+
+	@staticmethod
+	def evaluate_batch(degree, control_points, t, weights=None, knots=None):
+		"""
+		Вычисление множества кривых с одинаковым числом контрольных точек на общей сетке параметров одним вызовом.
+
+		Параметры:
+		- degree (int): Степень сплайнов.
+		- control_points (array-like): Контрольные точки формы (n_curves, n_ctrl, dim).
+		- t (array-like): Общая сетка параметров (N,).
+		- weights (array-like, optional): Веса формы (n_curves, n_ctrl) для NURBS.
+		- knots (array-like, optional): Общий узловой вектор; по умолчанию - как в generate_knots.
 
-		for i in range(n + 1):
-			b = self.basis_function(i, self.degree, t)
-			result += b * np.array(self.control_points[i])
+		Возвращает:
+		- ndarray формы (n_curves, N, dim)
+		"""
+		control_points = np.asarray(control_points, dtype=float)
+		if control_points.ndim != 3:
+			raise ValueError("Контрольные точки должны иметь форму (n_curves, n_ctrl, dim).")
+		n = control_points.shape[1]
+		if weights is not None:
+			weights = np.asarray(weights, dtype=float)
+			if weights.shape != control_points.shape[:2]:
+				raise ValueError("Веса должны иметь форму (n_curves, n_ctrl).")
+		if knots is None:
+			knots = b_spline._knot_vector(n, degree)
+		return b_spline._de_boor(np.asarray(knots, dtype=float), degree, control_points,
+								 np.atleast_1d(np.asarray(t, dtype=float)), weights)
 
+	@staticmethod
+	def _de_boor(knots, degree, points, t, weights=None):
+		"""
+		Алгоритм де Бура для массива параметров t (N,) и контрольных точек формы (..., n, dim).
+		Промежутки узлов и коэффициенты alpha зависят только от t, поэтому общие для всех кривых пакета.
+		Рациональные кривые вычисляются в однородных координатах (w * P, w).
+		"""
+		k = degree
+		knots = np.asarray(knots, dtype=float)
+		if weights is not None:
+			points = np.concatenate([points * weights[..., None], weights[..., None]], axis=-1)
+		n = points.shape[-2]
+
+		# Промежуток [knots[l], knots[l+1]), содержащий t
+		l = np.clip(np.searchsorted(knots, t, side='right') - 1, k, n - 1)
+		# d[j] - активная контрольная точка l - k + j для каждого t
+		d = np.moveaxis(points[..., l[None, :] + np.arange(-k, 1)[:, None], :], -3, 0)
+
+		for r in range(1, k + 1):
+			# Обратные длины носителей считаются по узлам, а не по точкам t (кратные узлы дают 0)
+			span = knots[k + 1 - r:k + 1 - r + n] - knots[:n]
+			inv_span = np.divide(1.0, span, out=np.zeros(n), where=span != 0)
+			for j in range(k, r - 1, -1):
+				i = l - k + j
+				alpha = ((t - knots[i]) * inv_span[i])[:, None]
+				d[j] = d[j - 1] + alpha * (d[j] - d[j - 1])
+
+		result = d[k]
+		if weights is not None:
+			result = result[..., :-1] / result[..., -1:]
 		return result
 
-	def plot(self):
-		t_values = np.linspace(self.knots[self.degree], self.knots[-self.degree - 1], 100)
-		# t_values = np.linspace(self.knots[degree], self.knots[-degree - 1], 100)
-		spline_points = np.array([self.evaluate(t) for t in t_values])
-		spline_points[-1] = spline_points[-2]
+	def insert_knot(self, u, times=1):
+		"""
+		Вставка узла u (алгоритм Бёма) без изменения формы кривой.
+
+		Параметры:
+		- u (float): Новый узел внутри области параметра.
+		- times (int): Сколько раз вставить узел.
+		"""
+		k = self.degree
+		knots = np.asarray(self.knots, dtype=float)
+		self.__check_inner_knots(np.array([u], dtype=float))
+		points = self.__homogeneous_points()
+
+		for _ in range(times):
+			n = len(points)
+			l = min(np.searchsorted(knots, u, side='right') - 1, n - 1)
+			i = np.arange(l - k + 1, l + 1)
+			alpha = ((u - knots[i]) / (knots[i + k] - knots[i]))[:, None]
+			points = np.concatenate([
+				points[:l - k + 1],
+				(1.0 - alpha) * points[i - 1] + alpha * points[i],
+				points[l:]
+			])
+			knots = np.insert(knots, l + 1, u)
+
+		self.knots = knots
+		self.__set_homogeneous_points(points)
+
+	def refine_knots(self, new_knots):
+		"""
+		Измельчение узлового вектора: все узлы new_knots вставляются за один шаг по алгоритму Осло.
+		Новые контрольные точки - P_new = T @ P, где T строится рекурсией дискретных B-сплайнов.
+
+		Параметры:
+		- new_knots (array-like): Вставляемые узлы (могут повторяться).
+		"""
+		new_knots = np.atleast_1d(np.asarray(new_knots, dtype=float))
+		if len(new_knots) == 0:
+			return
+		self.__check_inner_knots(new_knots)
+
+		old = np.asarray(self.knots, dtype=float)
+		refined = np.sort(np.concatenate([old, new_knots]))
+		T = b_spline._refinement_matrix(old, refined, self.degree)
+
+		self.knots = refined
+		self.__set_homogeneous_points(T @ self.__homogeneous_points())
+
+	@staticmethod
+	def _refinement_matrix(old, new, degree):
+		"""
+		Матрица измельчения (алгоритм Осло): T[j, i] = alpha_{i,k}(j) - дискретные B-сплайны старого
+		узлового вектора old, вычисленные на новом узловом векторе new.
+		"""
+		n_new = len(new) - degree - 1
+		tau = new[:, None]
+		j = np.arange(n_new)
+
+		T = ((old[None, :-1] <= tau[j]) & (tau[j] < old[None, 1:])).astype(float)
+		for p in range(1, degree + 1):
+			i = np.arange(len(old) - 1 - p)
+			t_jp = tau[j + p]
+			d1 = old[i + p] - old[i]
+			d2 = old[i + p + 1] - old[i + 1]
+			w1 = np.divide(t_jp - old[i], d1, out=np.zeros((n_new, len(i))), where=d1 != 0)
+			w2 = np.divide(old[i + p + 1] - t_jp, d2, out=np.zeros((n_new, len(i))), where=d2 != 0)
+			T = w1 * T[:, :-1] + w2 * T[:, 1:]
+		return T
+
+	def bezier_segments(self):
+		"""
+		Разложение кривой на сегменты Безье: кратность всех внутренних узлов доводится до степени k.
+
+		Возвращает:
+		- breakpoints (ndarray): Границы сегментов по параметру (n_segments + 1,).
+		- segments (ndarray): Контрольные точки Бернштейна формы (n_segments, k + 1, dim).
+		- weights (ndarray | None): Веса формы (n_segments, k + 1) для NURBS, иначе None.
+		"""
+		k = self.degree
+		knots = np.asarray(self.knots, dtype=float)
+		breakpoints, counts = np.unique(knots[k:len(knots) - k], return_counts=True)
+
+		inner = breakpoints[1:-1]
+		missing = np.repeat(inner, np.maximum(k - counts[1:-1], 0))
+		refined = np.sort(np.concatenate([knots, missing]))
+		T = b_spline._refinement_matrix(knots, refined, k)
+		points = T @ self.__homogeneous_points()
+
+		# Сегмент [t_i, t_i+1) использует контрольные точки i-k .. i, где i - последний индекс узла t_i.
+		# Начала считаются по накопленным кратностям: внутренний узел может иметь кратность больше k
+		start = np.searchsorted(refined, breakpoints[:-1], side='right') - 1 - k
+		index = start[:, None] + np.arange(k + 1)
+		segments = points[index]
+		if self.weights is None:
+			return breakpoints, segments, None
+		weights = segments[..., -1]
+		return breakpoints, segments[..., :-1] / weights[..., None], weights
+
+	@staticmethod
+	def subdivide_bezier(control_points, s=0.5):
+		"""
+		Деление сегментов Безье в точке s алгоритмом де Кастельжо.
+
+		Параметры:
+		- control_points (array-like): Контрольные точки формы (..., k + 1, dim).
+		- s (float): Локальный параметр деления из [0, 1].
+
+		Возвращает:
+		- (left, right): Контрольные точки двух половин той же формы.
+		"""
+		d = np.array(control_points, dtype=float)
+		left = [d[..., 0, :]]
+		right = [d[..., -1, :]]
+		for _ in range(d.shape[-2] - 1):
+			d = (1.0 - s) * d[..., :-1, :] + s * d[..., 1:, :]
+			left.append(d[..., 0, :])
+			right.append(d[..., -1, :])
+		return np.stack(left, axis=-2), np.stack(right[::-1], axis=-2)
+
+	def __check_inner_knots(self, knots):
+		k = self.degree
+		if np.any(knots <= self.knots[k]) or np.any(knots >= self.knots[-k - 1]):
+			raise ValueError("Вставляемые узлы должны лежать строго внутри области параметра.")
+
+	def __homogeneous_points(self):
+		points = np.asarray(self.control_points, dtype=float)
+		if self.weights is None:
+			return points
+		return np.hstack([points * self.weights[:, None], self.weights[:, None]])
+
+	def __set_homogeneous_points(self, points):
+		if self.weights is None:
+			self.control_points = points
+		else:
+			self.weights = points[:, -1]
+			self.control_points = points[:, :-1] / self.weights[:, None]
+		self._arc_table = None
+		self._projection_index = None
+
+	def derivative(self, t):
+		"""
+		Первая производная кривой C'(t) для массива параметров (для NURBS - по правилу частного).
+
+		Возвращает:
+		- ndarray формы (dim,) для скалярного t или (len(t), dim) для массива
+		"""
+		t = np.asarray(t, dtype=float)
+		k = self.degree
+		knots = np.asarray(self.knots, dtype=float)
+		points = self.__homogeneous_points()
+		ts = np.atleast_1d(t)
+
+		# Контрольные точки производной: k * (P_{i+1} - P_i) / (t_{i+k+1} - t_{i+1})
+		span = knots[k + 1:len(points) + k] - knots[1:len(points)]
+		scale = np.divide(k, span, out=np.zeros(len(span)), where=span != 0)
+		d_points = np.diff(points, axis=0) * scale[:, None]
+		if k == 0:
+			result = np.zeros((len(ts), points.shape[1]))
+		else:
+			result = b_spline._de_boor(knots[1:-1], k - 1, d_points, ts)
+
+		if self.weights is not None:
+			value = b_spline._de_boor(knots, k, points, ts)
+			w = value[:, -1:]
+			result = (result[:, :-1] - result[:, -1:] * value[:, :-1] / w) / w
+		return result[0] if t.ndim == 0 else result
+
+	def arc_length_table(self, n_per_span=32):
+		"""
+		Таблица длины дуги s(t): каждый промежуток узлов делится на n_per_span частей,
+		на каждой части |C'(t)| интегрируется квадратурой Гаусса-Лежандра по 5 точкам.
+
+		Возвращает:
+		- (t_table, s_table): Возрастающие массивы параметра и накопленной длины дуги.
+		"""
+		if self._arc_table is not None and self._arc_table[2] == n_per_span:
+			return self._arc_table[:2]
+
+		k = self.degree
+		breakpoints = np.unique(np.asarray(self.knots, dtype=float)[k:len(self.knots) - k])
+		fractions = np.linspace(0.0, 1.0, n_per_span + 1)[:-1]
+		t_table = np.append((breakpoints[:-1, None] + np.diff(breakpoints)[:, None] * fractions).ravel(),
+							breakpoints[-1])
+
+		pieces = self.__arc_length(t_table[:-1], t_table[1:])
+		s_table = np.concatenate([[0.0], np.cumsum(pieces)])
+		self._arc_table = (t_table, s_table, n_per_span)
+		return t_table, s_table
+
+	def __arc_length(self, a, b):
+		"""Длины дуг на отрезках параметра [a, b] (векторно, Гаусс-Лежандр по 5 точкам)"""
+		nodes, gauss_weights = np.polynomial.legendre.leggauss(5)
+		half = (np.asarray(b) - np.asarray(a)) / 2.0
+		mid = (np.asarray(b) + np.asarray(a)) / 2.0
+		t = (mid[:, None] + half[:, None] * nodes).ravel()
+		speed = np.linalg.norm(self.derivative(t), axis=1).reshape(len(mid), len(nodes))
+		return half * (speed @ gauss_weights)
+
+	def length(self):
+		"""Полная длина кривой"""
+		return self.arc_length_table()[1][-1]
+
+	def parameter_at_length(self, s, newton_steps=2):
+		"""
+		Обратная функция длины дуги t(s): поиск по таблице, линейная интерполяция и шаги Ньютона.
+
+		Параметры:
+		- s (array-like): Длины дуги от начала кривой, от 0 до length().
+		- newton_steps (int): Число уточняющих шагов Ньютона.
+		"""
+		s = np.asarray(s, dtype=float)
+		scalar = s.ndim == 0
+		s = np.clip(np.atleast_1d(s), 0.0, None)
+		t_table, s_table = self.arc_length_table()
+		s = np.minimum(s, s_table[-1])
+
+		j = np.clip(np.searchsorted(s_table, s, side='right') - 1, 0, len(s_table) - 2)
+		ds = s_table[j + 1] - s_table[j]
+		ratio = np.divide(s - s_table[j], ds, out=np.zeros_like(s), where=ds > 0)
+		t = t_table[j] + ratio * (t_table[j + 1] - t_table[j])
+
+		for _ in range(newton_steps):
+			error = s_table[j] + self.__arc_length(t_table[j], t) - s
+			speed = np.linalg.norm(self.derivative(t), axis=1)
+			step = np.divide(error, speed, out=np.zeros_like(error), where=speed > 0)
+			t = np.clip(t - step, t_table[j], t_table[j + 1])
+
+		return t[0] if scalar else t
+
+	def adaptive_sample(self, tolerance, max_depth=20):
+		"""
+		Адаптивная выборка точек кривой с ограничением хордовой погрешности: сегменты Безье делятся пополам,
+		пока все внутренние контрольные точки не окажутся ближе tolerance к хорде. По свойству выпуклой
+		оболочки кривая тогда отклоняется от ломаной не более чем на tolerance: на плоских участках точек мало,
+		на крутых изгибах - много.
+
+		Параметры:
+		- tolerance (float): Допустимое отклонение кривой от ломаной.
+		- max_depth (int): Максимальная глубина деления одного сегмента.
+
+		Возвращает:
+		- (t, points): Параметры (N,) и точки кривой (N, dim). В местах разрыва кривой соседние параметры
+		  отличаются на одну единицу младшего разряда, и звено между ними кривой не принадлежит.
+		"""
+		breakpoints, segments, weights = self.bezier_segments()
+		if weights is not None:
+			segments = np.concatenate([segments * weights[..., None], weights[..., None]], axis=-1)
+		intervals = np.column_stack([breakpoints[:-1], breakpoints[1:]])
+		# Внутренний узел кратности k + 1 даёт разрыв кривой: перед ним добавляется точка левого предела
+		jumps = np.any(segments[:-1, -1] != segments[1:, 0], axis=-1)
+
+		accepted = [breakpoints]
+		for depth in range(max_depth + 1):
+			points = segments if weights is None else segments[..., :-1] / segments[..., -1:]
+			start, end = points[:, :1], points[:, -1:]
+			chord = end - start
+			chord_sq = np.sum(chord ** 2, axis=-1, keepdims=True)
+			projection = np.sum((points - start) * chord, axis=-1, keepdims=True)
+			c = np.divide(projection, chord_sq, out=np.zeros_like(projection), where=chord_sq > 0)
+			c = np.clip(c, 0.0, 1.0)
+			deviation = np.linalg.norm(points - start - c * chord, axis=-1).max(axis=1)
+
+			split = deviation > tolerance
+			if depth == max_depth or not np.any(split):
+				break
+			segments = np.concatenate(b_spline.subdivide_bezier(segments[split]))
+			a, b = intervals[split, 0], intervals[split, 1]
+			mid = (a + b) / 2.0
+			accepted.append(mid)
+			intervals = np.concatenate([np.column_stack([a, mid]), np.column_stack([mid, b])])
+
+		accepted.append(np.nextafter(breakpoints[1:-1][jumps], -np.inf))
+		t = np.unique(np.concatenate(accepted))
+		return t, self.evaluate(t)
+
+	def build_projection_index(self, tolerance=None, max_edge=None):
+		"""
+		Пространственный индекс для closest_point: сегменты Безье делятся (adaptive_sample), пока их
+		выпуклые оболочки не станут тоньше tolerance, длинные звенья дробятся до max_edge, и по вершинам
+		полученной ломаной строится k-d дерево. Строится один раз на кривую.
+
+		Параметры:
+		- tolerance (float, optional): Хордовая погрешность ломаной; по умолчанию 1e-4 диагонали контрольных точек.
+		- max_edge (float, optional): Наибольшая длина звена; по умолчанию 1e-2 диагонали.
+		"""
+		control_points = np.asarray(self.control_points, dtype=float)
+		diagonal = np.linalg.norm(np.ptp(control_points, axis=0))
+		if tolerance is None:
+			tolerance = 1e-4 * diagonal
+		if max_edge is None:
+			max_edge = 1e-2 * diagonal
+		t, points = self.adaptive_sample(tolerance)
+
+		# Равномерное по t дробление длинных звеньев; звенья через разрыв кривой не дробятся
+		edges = np.linalg.norm(np.diff(points, axis=0), axis=1)
+		jumps = np.diff(t) <= np.spacing(np.abs(t[1:]))
+		pieces = np.maximum(np.ceil(edges / max_edge), 1).astype(int) if max_edge > 0 else np.ones(len(edges), int)
+		pieces[jumps] = 1
+		if np.any(pieces > 1):
+			offsets = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+			segment = np.repeat(np.arange(len(edges)), pieces)
+			t = np.append(t[segment] + offsets / pieces[segment] * np.diff(t)[segment], t[-1])
+			jumps = jumps[segment]
+			points = self.evaluate(t)
+			edges = np.linalg.norm(np.diff(points, axis=0), axis=1)
+
+		max_edge = edges[~jumps].max() if np.any(~jumps) else 0.0
+		self._projection_index = (cKDTree(points), t, points, max_edge, jumps)
+		return self._projection_index
+
+	def closest_point(self, queries, newton_steps=5, n_candidates=8):
+		"""
+		Проекция точек на кривую. Для каждой точки k-d дерево за O(log n) находит ближайшие вершины ломаной,
+		проекция на примыкающие звенья даёт начальное t, которое уточняется векторизованными шагами
+		Ньютона для уравнения C'(t) · (C(t) - q) = 0 с откатом шага, если расстояние растёт. Если k ближайших
+		вершин не гарантируют ближайшее звено (все они ближе d + max_edge), k увеличивается.
+
+		Параметры:
+		- queries (array-like): Точки формы (N, dim) или (dim,).
+		- newton_steps (int): Число шагов уточнения.
+		- n_candidates (int): Сколько ближайших вершин ломаной проверять.
+
+		Возвращает:
+		- (t, points, distances): Параметры, ближайшие точки кривой и расстояния до них.
+		"""
+		if self._projection_index is None:
+			self.build_projection_index()
+		tree, t_samples, samples, max_edge, jumps = self._projection_index
+
+		queries = np.asarray(queries, dtype=float)
+		scalar = queries.ndim == 1
+		q = np.atleast_2d(queries)
+		n_samples = len(t_samples)
+
+		def project(q, nearest):
+			# Проекция на звенья ломаной, примыкающие к вершинам nearest (N, k)
+			starts = np.clip(np.concatenate([nearest - 1, nearest], axis=1), 0, n_samples - 2)
+			a = samples[starts]
+			edge = samples[starts + 1] - a
+			edge_sq = np.sum(edge ** 2, axis=-1)
+			projection = np.sum((q[:, None] - a) * edge, axis=-1)
+			c = np.clip(np.divide(projection, edge_sq, out=np.zeros_like(projection), where=edge_sq > 0), 0.0, 1.0)
+			distance = np.linalg.norm(q[:, None] - a - c[..., None] * edge, axis=-1)
+			distance[jumps[starts]] = np.inf  # звено через разрыв кривой не принадлежит
+			best = np.argmin(distance, axis=1)
+			rows = np.arange(len(q))
+			return starts[rows, best], c[rows, best], distance[rows, best]
+
+		start = np.zeros(len(q), dtype=int)
+		c = np.zeros(len(q))
+		distance = np.zeros(len(q))
+		# Неподтверждённые точки (ближайшее звено может начинаться с вершины за пределами k ближайших)
+		# перезапрашиваются с вчетверо большим k
+		uncertain = np.arange(len(q))
+		k = min(n_candidates, n_samples)
+		while len(uncertain):
+			vertex_distance, nearest = tree.query(q[uncertain], k=k)
+			vertex_distance = vertex_distance.reshape(len(uncertain), -1)
+			start[uncertain], c[uncertain], distance[uncertain] = project(q[uncertain], nearest.reshape(len(uncertain), -1))
+			if k == n_samples:
+				break
+			uncertain = uncertain[vertex_distance[:, -1] <= distance[uncertain] + max_edge]
+			k = min(4 * k, n_samples)
+
+		t = t_samples[start] + c * (t_samples[start + 1] - t_samples[start])
+		lower = t_samples[np.maximum(start - 1, 0)]
+		upper = t_samples[np.minimum(start + 2, n_samples - 1)]
+
+		# Вторая производная берётся центральной разностью от derivative
+		h = 1e-6 * (t_samples[-1] - t_samples[0])
+		points = self.evaluate(t)
+		distances = np.linalg.norm(points - q, axis=1)
+		for _ in range(newton_steps):
+			residual = points - q
+			tangent = self.derivative(t)
+			second = (self.derivative(np.minimum(t + h, t_samples[-1])) - self.derivative(np.maximum(t - h, t_samples[0]))) / (2 * h)
+			gradient = np.sum(tangent * residual, axis=1)
+			hessian = np.sum(tangent ** 2, axis=1) + np.sum(second * residual, axis=1)
+			# Вне выпуклой области (hessian <= 0) — шаг Гаусса-Ньютона
+			hessian = np.where(hessian > 0, hessian, np.sum(tangent ** 2, axis=1))
+			step = np.divide(gradient, hessian, out=np.zeros_like(gradient), where=hessian > 0)
+
+			# Шаг принимается, только если расстояние не растёт; иначе он делится пополам
+			active = np.flatnonzero(step != 0)
+			for _ in range(8):
+				if not len(active):
+					break
+				candidate = np.clip(t[active] - step[active], lower[active], upper[active])
+				candidate_points = self.evaluate(candidate)
+				candidate_distances = np.linalg.norm(candidate_points - q[active], axis=1)
+				accept = candidate_distances <= distances[active]
+				accepted = active[accept]
+				t[accepted] = candidate[accept]
+				points[accepted] = candidate_points[accept]
+				distances[accepted] = candidate_distances[accept]
+				active = active[~accept]
+				step[active] /= 2
+		if scalar:
+			return t[0], points[0], distances[0]
+		return t, points, distances
+
+	def plot(self, tolerance=None):
+		"""
+		Построение кривой с адаптивной выборкой точек.
+
+		Параметры:
+		- tolerance (float, optional): Допустимая хордовая погрешность; по умолчанию 0.1% диагонали контрольных точек.
+		"""
+		if tolerance is None:
+			control_points = np.asarray(self.control_points, dtype=float)
+			tolerance = 1e-3 * np.linalg.norm(np.ptp(control_points, axis=0))
+		_, spline_points = self.adaptive_sample(tolerance)
 
 		plt.figure(figsize=(8, 6))
 		plt.plot(spline_points[:, 0], spline_points[:, 1], label='B-Сплайн', color='blue')
@@ -1869,72 +2666,90 @@ class b_spline(spline):
 class mars_spline(Spline):
 	class basis_function:
 		"""
-		Базисная функция для MARS-сплайна.
-		Позволяет использовать базисные функции в виде f(x) = c * (x - t)⁺ или f(x) = c * (t - x)⁺,
+		Базисная функция для MARS-сплайна — ссылка на строку таблицы термов.
+		Терм j задаётся как B_j(x) = B_parent(x) * max(0, sign * (x[variable] - knot)), B_0(x) = 1.
 		"""
 
-		def __init__(self, func):
+		def __init__(self, terms, index):
 			"""
 			Инициализация базисной функции
 			Args:
-				func: Лябда-функция, которая будет использоваться в базисной функции
+				terms: Таблица термов (структурированный массив mars_spline.TERM_DTYPE)
+				index: Номер терма в таблице
 			"""
-			self.func = func
-
-		# self.symbolic = None
+			self.terms = terms
+			self.index = index
 
-		def __call__(self, *args):
+		def __call__(self, x):
 			"""
 			Вызов базисной функции
 			Args:
-				*args: Список предикторов, который будут передан в базисную функцию
+				x: Одно наблюдение (вектор предикторов) или матрица наблюдений (N×P)
 			"""
-			return self.func(*args)
+			x = np.asarray(x, dtype=float)
+			single = x.ndim == 1
+			B = mars_spline._evaluate_terms(self.terms[:self.index + 1], np.atleast_2d(x))
+			return B[0, -1] if single else B[:, -1]
 
-		def __mul__(self, other):
-			"""
-			Перегрузка оператора умножения для базисных функций.
-			"""
-			# Если другой объект - это базисная функция, то возвращаем новую базисную функцию
-			# Если другой объект - это число, то возвращаем новую базисную функцию с умноженным значением
-			if isinstance(other, mars_spline.basis_function):
-				return mars_spline.basis_function(lambda *args: self(*args) * other(*args))
-			elif isinstance(other, (int, float)):
-				return mars_spline.basis_function(lambda *args: other * self(*args))
-			else:
-				return NotImplemented
+	class evaluator:
+		"""
+		Лёгкий вычислитель обученного MARS-сплайна: таблица термов и коэффициенты, без данных и кода обучения.
+		Создаётся из результата mars_spline.export() или из сохранённого им файла (.json / .npz).
+		"""
 
-		def __rmul__(self, other):
+		def __init__(self, terms, coefficients, active=None):
 			"""
-			Перегрузка оператора умножения для базисных функций с левой стороны.
+			Args:
+				terms: Таблица термов (структурированный массив mars_spline.TERM_DTYPE)
+				coefficients: Коэффициенты активных термов (M,) или (M, k)
+				active: Индексы активных термов в таблице; по умолчанию все
 			"""
-			return self.__mul__(other)
+			self.terms = np.asarray(terms, dtype=mars_spline.TERM_DTYPE)
+			self.coefficients = np.asarray(coefficients, dtype=float)
+			self.active = np.arange(len(self.terms)) if active is None else np.asarray(active, dtype=np.intp)
 
-		def __add__(self, other):
+		@classmethod
+		def load(cls, source):
 			"""
-			Перегрузка оператора сложения для базисных функций.
+			Загрузка из словаря export() или из файла .json / .npz.
 			"""
-			# Если другой объект - это базисная функция, то возвращаем новую базисную функцию
-			# Если другой объект - это число, то возвращаем новую базисную функцию с добавленным значением
-			if isinstance(other, mars_spline.basis_function):
-				return mars_spline.basis_function(lambda *args: self(*args) + other(*args))
-			elif isinstance(other, (int, float)):
-				return mars_spline.basis_function(lambda *args: self(*args) + other)
-			return NotImplemented
-
-		def __radd__(self, other):
+			if isinstance(source, (str, os.PathLike)):
+				if str(source).endswith('.json'):
+					with open(source, encoding='utf-8') as f:
+						source = json.load(f)
+				else:
+					with np.load(source) as data:
+						source = {key: data[key] for key in data.files}
+			if int(np.asarray(source['version'])) != mars_spline.EXPORT_VERSION:
+				raise ValueError(f"Unsupported export version: {source['version']}")
+			terms = np.empty(len(source['parent']), dtype=mars_spline.TERM_DTYPE)
+			for field in mars_spline.TERM_DTYPE.names:
+				terms[field] = source[field]
+			return cls(terms, source['coefficients'], source['active'])
+
+		def predict(self, x, chunk_size=1 << 18):
 			"""
-			Перегрузка оператора сложения для базисных функций с левой стороны.
+			Векторизованное предсказание по блокам из chunk_size строк (память O(chunk_size · M)).
 			"""
-			# This lets `sum()` start with 0
-			if isinstance(other, (int, float)):
-				return mars_spline.basis_function(lambda *args: other + self(*args))
-			return NotImplemented
-	# return self.__add__(other)
+			x = np.asarray(x)
+			x = x.reshape(-1, 1) if x.ndim == 1 else x
+			result = np.empty((len(x),) + self.coefficients.shape[1:])
+			for start in range(0, len(x), chunk_size):
+				block = np.asarray(x[start:start + chunk_size], dtype=float)
+				result[start:start + chunk_size] = \
+					mars_spline._evaluate_terms(self.terms, block)[:, self.active] @ self.coefficients
+			return result
 
 	"""Multivariate Adaptive Regression Spline"""
 
-	def __init__(self, M_max, x, y, with_pruning=True, d=3, lof='gcv'):
+	# Строка таблицы термов: родительский терм, предиктор, точка разреза и знак hinge-множителя
+	TERM_DTYPE = np.dtype([('parent', np.intp), ('variable', np.intp), ('knot', np.float64), ('sign', np.int8)])
+	EXPORT_VERSION = 1  # Увеличивается при изменении формата export()
+
+	def __init__(self, M_max, x, y, with_pruning=True, d=3, lof='gcv', fast_K=None, fast_beta=1.0,
+				 n_jobs=None, minspan=None, endspan=None, alpha=0.05, max_degree=None, max_candidates=None,
+				 min_improvement=None, max_r2=None, max_time=None, max_evaluations=None, chunk_size=None,
+				 dtype=np.float64):
 		"""
 		Инициализация MARS-сплайна
 
@@ -1950,7 +2765,50 @@ class mars_spline(Spline):
 			lof:
 				Lack-of-fit (LOF) функция, которая будет использоваться для оценки качества модели.
 				Можно выбрать 'gcv' (Generalized Cross-Validation) или 'rss' (Residual Sum of Squares).
-		"""
+			fast_K (int, optional):
+				Fast MARS (Friedman, 1993): на каждом шаге forward pass перебираются только fast_K родителей
+				с наивысшим приоритетом. None — перебирать всех родителей.
+			fast_beta (float):
+				Параметр старения для Fast MARS. Приоритет родителя — ранг его последнего улучшения RSS
+				за вычетом fast_beta * (число шагов с последнего перебора), так что давно не проверенные
+				родители постепенно возвращаются в перебор.
+			n_jobs (int, optional):
+				Число потоков для перебора пар (родитель, предиктор) в forward pass. Потоки разделяют x и
+				матрицу базиса без копирования; результат совпадает с последовательным перебором.
+			minspan (int | 'auto', optional):
+				Шаг между точками разреза в наблюдениях внутри носителя родителя. 'auto' — по Friedman (1991):
+				L = -log2(-ln(1 - alpha) / (p * N_m)) / 2.5, где N_m — размер носителя. None — все точки.
+			endspan (int | 'auto', optional):
+				Сколько крайних наблюдений с каждой стороны не используются как точки разреза.
+				'auto' — L_e = 3 - log2(alpha / p). None — без ограничения.
+			alpha (float): Уровень значимости для 'auto' в minspan и endspan.
+			max_degree (int, optional): Наибольшее число hinge-множителей в терме (степень взаимодействия).
+			max_candidates (int, optional):
+				Если после прореживания точек разреза больше, берутся max_candidates квантилей.
+			min_improvement (float, optional):
+				Forward pass останавливается, если очередная пара термов уменьшила LOF (RSS или GCV)
+				меньше чем в (1 - min_improvement) раз.
+			max_r2 (float, optional): Forward pass останавливается, когда R² модели достигает max_r2.
+			max_time (float, optional): Бюджет времени forward pass в секундах.
+			max_evaluations (int, optional): Бюджет числа оценённых точек разреза в forward pass.
+				Бюджеты проверяются перед каждым шагом, поэтому превышение не больше одного шага.
+			chunk_size (int, optional):
+				Обучение по блокам из chunk_size строк (out-of-core). Включается также для np.memmap
+				и для источника блоков в fit; по умолчанию тогда 65536 строк. Точки разреза в блоках — общие
+				max_candidates (по умолчанию 100) квантилей каждого предиктора; minspan и endspan применяются
+				к ним по числу наблюдений носителя родителя между соседними точками.
+			dtype: Тип x и столбцов базиса в блоках (np.float32 вдвое сокращает память);
+				суммы и перекрёстные произведения всегда накапливаются в float64.
+		"""
+		if fast_K is not None and fast_K < 1:
+			raise ValueError(f"Invalid fast_K value: {fast_K}. Must be a positive integer or None.")
+		for name, span in (('minspan', minspan), ('endspan', endspan)):
+			if not (span is None or span == 'auto' or (isinstance(span, (int, np.integer)) and span >= 0)):
+				raise ValueError(f"Invalid {name} value: {span}. Must be a non-negative integer, 'auto' or None.")
+		if max_degree is not None and max_degree < 1:
+			raise ValueError(f"Invalid max_degree value: {max_degree}. Must be a positive integer or None.")
+		if max_candidates is not None and max_candidates < 1:
+			raise ValueError(f"Invalid max_candidates value: {max_candidates}. Must be a positive integer or None.")
 		x = np.asarray(x)
 		if x.ndim == 1:
 			n_predictors = 1  # treat 1D array as a single "column"
@@ -1965,12 +2823,26 @@ class mars_spline(Spline):
 		M_max |= 1  # sets the least significant bit to 1, making it odd
 		self.M_max = M_max  # min(M_max, len(y))
 		self.coefficients = None
-		self.basis_functions = np.array([mars_spline.basis_function(lambda x: 1) for _ in range(self.M_max)],
-										dtype=object)
+		self.__reset_terms()
 		self.__predictor_indices = list(range(n_predictors))
-		self.__used_predictors = np.array([set() for _ in range(self.M_max)], dtype=object)
 		self.__with_pruning = with_pruning
 		self.d = d
+		self.fast_K = fast_K
+		self.fast_beta = fast_beta
+		self.n_jobs = n_jobs
+		self.minspan = minspan
+		self.endspan = endspan
+		self.alpha = alpha
+		self.max_degree = max_degree
+		self.max_candidates = max_candidates
+		self.min_improvement = min_improvement
+		self.max_r2 = max_r2
+		self.max_time = max_time
+		self.max_evaluations = max_evaluations
+		self.stop_reason = None  # Причина остановки forward pass
+		self.chunk_size = chunk_size
+		self.dtype = np.dtype(dtype)
+		self._response_ndim = None  # Размерность y в блоках (запоминается в _blocks)
 		if lof == 'gcv':
 			self.LOF = self.LOF_GCV
 		elif lof == 'rss':
@@ -1978,176 +2850,738 @@ class mars_spline(Spline):
 		else:
 			raise ValueError(f"Invalid lof value: {lof}. Must be 'gcv' or 'rss'.")
 
-	def _candidate_basis_generator(self, M, x):
+	def __reset_terms(self):
+		"""
+		Сбрасывает модель до одного константного терма B_0 = 1.
+		"""
+		self.terms = np.array([(-1, -1, 0.0, 0)], dtype=mars_spline.TERM_DTYPE)
+		self.active = np.array([0])  # Термы, оставшиеся после backward pass
+		self.basis_functions = [mars_spline.basis_function(self.terms, 0)]
+		# Предикторы, уже входящие в произведение терма (повторно в нём не используются)
+		self.__used_predictors = [frozenset()]
+		# Очередь Fast MARS: последнее улучшение RSS от терма как родителя и число шагов с его перебора
+		self.__parent_improvement = [np.inf]
+		self.__parent_age = [0]
+
+	def __add_term(self, parent, variable, knot, sign):
+		"""
+		Добавляет строку в таблицу термов.
+		"""
+		term = np.array([(parent, variable, knot, sign)], dtype=mars_spline.TERM_DTYPE)
+		self.terms = np.concatenate([self.terms, term])
+		self.__used_predictors.append(self.__used_predictors[parent] | {variable})
+		self.__parent_improvement.append(np.inf)  # новые родители перебираются в первую очередь
+		self.__parent_age.append(0)
+
+	def _select_parents(self):
+		"""
+		Выбирает родителей для очередного шага forward pass (Fast MARS).
+		Returns:
+			np.ndarray: Индексы родительских термов
+		"""
+		n_terms = len(self.terms)
+		if self.fast_K is None or n_terms <= self.fast_K:
+			return np.arange(n_terms)
+		improvement = np.asarray(self.__parent_improvement)
+		rank = np.empty(n_terms)
+		rank[np.argsort(-improvement, kind='stable')] = np.arange(n_terms)
+		priority = rank - self.fast_beta * np.asarray(self.__parent_age)
+		return np.sort(np.argsort(priority, kind='stable')[:self.fast_K])
+
+	@staticmethod
+	def _as_matrix(x):
 		"""
-		Генератор для поиска новых кандидатов на базисные функции B_M и B_M+1.
+		Приводит данные к матрице наблюдений (N×P), одномерный x считается одним предиктором.
+		"""
+		x = np.asarray(x, dtype=float)
+		return x.reshape(-1, 1) if x.ndim == 1 else x
+
+	@staticmethod
+	def _evaluate_terms(terms, x, dtype=np.float64):
+		"""
+		Вычисляет матрицу базиса по таблице термов: каждый столбец — одно векторное умножение
+		столбца родителя на hinge-множитель.
 		Args:
-			M (int): Текущее количество базисных функций
-			x (array-like): Данные независимых переменных
+			terms: Таблица термов (структурированный массив TERM_DTYPE), родители идут раньше потомков
+			x (np.ndarray): Матрица наблюдений (N×P)
+			dtype: Тип элементов матрицы
+		Returns:
+			np.ndarray: Матрица B (N×len(terms))
+		"""
+		B = np.empty((len(x), len(terms)), dtype=dtype)
+		B[:, 0] = 1.0
+		for j in range(1, len(terms)):
+			parent, variable, knot, sign = terms[j]
+			B[:, j] = B[:, parent] * mars_spline.hinge(x[:, variable], knot, sign)
+		return B
+
+	def _candidate_basis_generator(self, parents):
+		"""
+		Генератор пар (родительский терм m, предиктор v) для новых базисных функций B_M и B_M+1.
+		Точки разреза для пары перебираются в _knot_sweep.
+		Args:
+			parents (array-like): Индексы перебираемых родительских термов
 			Yields:
-				tuple: Кортеж из базисных функций B_M и B_M+1, индекса предиктора v, точки разреза t и индекса m родительской базисной функции"""
-		for m in range(0, M - 1):  # начинаем с 0, а не с 1, как в статье, т.к. индексы начинаются с 0
-			not_used = [i for i in self.__predictor_indices if i not in self.__used_predictors[m]]
-			for v in not_used:
-				cut_points = np.unique([x[j, v] for j in range(0, len(x)) if self.basis_functions[m](x[j]) > 0])
-				# bf_sum = sum(self.basis_functions[:M-1])
-
-				for t in cut_points:
-					B_M = self.basis_functions[m] * self.hinge(v, t, 1)
-					B_M1 = self.basis_functions[m] * self.hinge(v, t, -1)
-					yield (B_M, B_M1, v, t, m)
+				tuple: Кортеж из индекса m родительской базисной функции и индекса предиктора v"""
+		for m in parents:
+			if self.max_degree is not None and len(self.__used_predictors[m]) >= self.max_degree:
+				continue
+			for v in self.__predictor_indices:
+				if v not in self.__used_predictors[m]:
+					yield (m, v)
 
 		return
 
-	def forward_pass(self, x, y):
+	@staticmethod
+	def _orthonormal_basis(B, y):
+		"""
+		Ортонормированный базис линейной оболочки столбцов B (QR с выбором ведущего столбца,
+		линейно зависимые столбцы отбрасываются) и остатки y после проекции на неё.
+		Args:
+			B (np.ndarray): Матрица базиса (N×M)
+			y (np.ndarray): Отклики (N×k)
+		Returns:
+			tuple: Q (N×rank) и остатки (N×k)
+		"""
+		Q, R, _ = qr(B, mode='economic', pivoting=True)
+		diagonal = np.abs(np.diag(R))
+		rank = np.count_nonzero(diagonal > max(B.shape) * np.finfo(float).eps * diagonal[0])
+		Q = Q[:, :rank]
+		return Q, y - Q @ (Q.T @ y)
+
+	def _spans(self, n):
+		"""
+		Значения endspan и minspan (с раскрытием 'auto' по Фридману) для носителя родителя.
+		Args:
+			n (int): Число наблюдений на носителе родителя
+		Returns:
+			tuple: (endspan, minspan)
+		"""
+		p = len(self.__predictor_indices)
+		endspan, minspan = self.endspan or 0, self.minspan or 1
+		if endspan == 'auto':
+			endspan = int(np.ceil(3 - np.log2(self.alpha / p)))
+		if minspan == 'auto':
+			minspan = int(max(1, np.floor(-np.log2(-np.log(1 - self.alpha) / (p * n)) / 2.5)))
+		return endspan, minspan
+
+	def _knot_candidates(self, x):
+		"""
+		Точки разреза для отсортированных значений предиктора на носителе родителя: отбрасываются
+		endspan крайних наблюдений, берётся каждое minspan-е, при необходимости — max_candidates квантилей.
+		Args:
+			x (np.ndarray): Значения предиктора на носителе родителя, по возрастанию
+		Returns:
+			np.ndarray: Точки разреза
+		"""
+		n = len(x)
+		endspan, minspan = self._spans(n)
+		positions = np.arange(endspan, n - endspan, minspan)
+		if self.max_candidates is not None and len(positions) > self.max_candidates:
+			positions = positions[np.round(np.linspace(0, len(positions) - 1, self.max_candidates)).astype(int)]
+		return np.unique(x[positions])
+
+	def _knot_sweep(self, parent, column, order, Q, residual):
+		"""
+		Быстрый перебор точек разреза (Friedman, 1991) для пары (родитель, предиктор).
+
+		Пара B_m·(x - t)⁺, B_m·(t - x)⁺ порождает то же пространство, что u = B_m·x и c(t) = B_m·(x - t)⁺,
+		поскольку B_m уже в базисе. Вклад u общий для всех t, а все скалярные произведения c(t) с u,
+		остатками и Q раскладываются на суффиксные суммы по наблюдениям, отсортированным по x,
+		поэтому все точки разреза оцениваются за O(N·M) вместо отдельной регрессии на каждую.
+		Args:
+			parent (np.ndarray): Столбец родительского терма B_m
+			column (np.ndarray): Значения предиктора x_v
+			order (np.ndarray): Перестановка, сортирующая column по возрастанию
+			Q (np.ndarray): Ортонормированный базис текущей модели (N×rank)
+			residual (np.ndarray): Остатки текущей модели (N×k)
+		Returns:
+			tuple: Наибольшее уменьшение RSS, точка разреза t, на которой оно достигается, и число оценённых точек
+		"""
+		rows = order[parent[order] > 0]
+		if not len(rows):
+			return -np.inf, None, 0
+		x, w, Q, r = column[rows], parent[rows], Q[rows], residual[rows]
+
+		# u = B_m·x; c(t) = w·(x - t) на строках с x > t
+		u = w * x
+		knots = self._knot_candidates(x)
+		start = np.searchsorted(x, knots, side='right')
+		inner = start < len(x)  # при t = max(x) столбец c нулевой
+		knots, start = knots[inner], start[inner]
+
+		def suffix(a):
+			# S[i] = сумма a[start[i]:]; при редких точках разреза — по блокам между ними
+			if not len(start):
+				return np.zeros((0,) + a.shape[1:])
+			if 4 * len(start) < len(a):
+				return np.cumsum(np.add.reduceat(a, start, axis=0)[::-1], axis=0)[::-1]
+			return np.cumsum(a[::-1], axis=0)[::-1][start]
+
+		w2 = w * w
+		reduction, t = mars_spline._score_knots(
+			knots, suffix(u[:, None] * Q), suffix(w[:, None] * Q), suffix(w2), suffix(w2 * x), suffix(w2 * x * x),
+			suffix(u[:, None] * r), suffix(w[:, None] * r), Q.T @ u, u @ u, u @ r)
+		return reduction, column[rows[-1]] if t is None else t, max(len(knots), 1)
+
+	@staticmethod
+	def _score_knots(knots, qu, qw, s0, s1, s2, ru, rw, a, uu, ur):
+		"""
+		Уменьшение RSS от добавления u = B_m·x и c(t) = B_m·(x - t)⁺ для каждой точки разреза t.
+		Все суммы берутся по наблюдениям с x > t, Q — ортонормированный базис текущей модели.
+		Args:
+			knots (np.ndarray): Точки разреза (T)
+			qu, qw (np.ndarray): Σ Q·u и Σ Q·w (T×rank)
+			s0, s1, s2 (np.ndarray): Σ w², Σ w²·x, Σ w²·x² (T)
+			ru, rw (np.ndarray): Σ u·r и Σ w·r по откликам (T×k)
+			a (np.ndarray): Qᵀu по всем наблюдениям
+			uu (float): u·u
+			ur (np.ndarray): uᵀr по откликам
+		Returns:
+			tuple: Наибольшее уменьшение RSS и точка разреза (None, если подходит только u)
+		"""
+		eps = 1e-10
+		uu_perp = uu - a @ a
+		u_ok = uu_perp > eps * uu
+		u_part = ur @ ur / uu_perp if u_ok else 0.0
+		if not len(knots):
+			return u_part, None
+
+		t = knots[:, None]
+		g = qu - t * qw  # Qᵀc(t)
+		cc = s2 - 2 * knots * s1 + knots ** 2 * s0
+		cu = s2 - knots * s1 - g @ a
+		cr = ru - t * rw
+		cp = cc - np.sum(g ** 2, axis=1)
+		if u_ok:
+			cr = cr - cu[:, None] * ur / uu_perp
+			cp = cp - cu ** 2 / uu_perp
+
+		valid = cp > eps * cc
+		c_part = np.divide(np.sum(cr ** 2, axis=1), cp, out=np.zeros_like(cp), where=valid)
+		if not valid.any():
+			return u_part, None
+		best = np.argmax(c_part)
+		return u_part + c_part[best], knots[best]
+
+	def forward_pass(self, x, y, sample_weight=None):
 		"""
 		Forward pass of the MARS algorithm.
 		Args:
 			x (array-like): Данные независимых переменных
-			y (array-like): Данные зависимой переменной
+			y (array-like): Данные зависимой переменной (N,) или (N×k); LOF суммируется по откликам
+			sample_weight (array-like, optional): Веса наблюдений
+		Returns:
+			np.ndarray: Матрица базиса всех добавленных термов; при весах строки B и y умножены на √w
+		"""
+		y = y.reshape(len(y), -1)
+		root = np.ones((len(y), 1)) if sample_weight is None else np.sqrt(sample_weight).reshape(-1, 1)
+		tss = np.sum(root ** 2 * y ** 2) - np.sum((root ** 2 * y).sum(axis=0) ** 2) / np.sum(root ** 2)
+		y = root * y  # взвешенный МНК — обычный МНК для √w·B и √w·y
+		order = np.argsort(x, axis=0, kind='stable')  # сортировка предикторов — одна на весь проход
+		state = {'B': root * self._evaluate_terms(self.terms, x)}
+
+		def evaluate_model():
+			state['Q'], state['residual'] = self._orthonormal_basis(state['B'], y)
+			return np.sum(state['residual'] ** 2), state['Q'].shape[1]
+
+		def sweep(pair):
+			m, v = pair
+			return self._knot_sweep(state['B'][:, m], x[:, v], order[:, v], state['Q'], state['residual'])
+
+		def add_pair(m, v, t):
+			B = state['B']
+			state['B'] = np.column_stack([B, B[:, m] * mars_spline.hinge(x[:, v], t, 1),
+										  B[:, m] * mars_spline.hinge(x[:, v], t, -1)])
+
+		n_jobs = max(1, self.n_jobs or 1)
+		pool = ThreadPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+		try:
+			sweep_pairs = (lambda pairs: pool.map(sweep, pairs)) if pool is not None else (lambda pairs: map(sweep, pairs))
+			self.__grow(evaluate_model, sweep_pairs, add_pair, len(y), tss)
+		finally:
+			if pool is not None:
+				pool.shutdown()
+		return state['B']
+
+	def __grow(self, evaluate_model, sweep_pairs, add_pair, N, tss):
 		"""
+		Основной цикл forward pass: добавляет пары термов, пока их число не достигнет M_max
+		или не сработает одно из правил остановки (_stop_reason).
+		Args:
+			evaluate_model (Callable): Регрессия текущей модели, возвращает (RSS, ранг базиса)
+			sweep_pairs (Callable): Оценка пар (m, v), возвращает (уменьшение RSS, t, число точек) для каждой
+			add_pair (Callable): Добавление пары термов (m, v, t) в данные forward pass
+			N (int): Число наблюдений
+			tss (float): Полная сумма квадратов отклонений y от среднего
+		"""
+		start_time = time.perf_counter()
+		evaluations = 0
+		lof_previous = np.inf
 		M = 2
 		while M <= self.M_max:
-			lof_star = np.inf
+			rss, rank = evaluate_model()
+			lof = self.LOF(rss, N, len(self.terms), rank)
+			self.stop_reason = self._stop_reason(rss, tss, lof, lof_previous, time.perf_counter() - start_time,
+												 evaluations)
+			if self.stop_reason is not None:
+				break
+			lof_previous = lof
+			reduction_star = -np.inf
 			m_star = None
 			v_star = None
 			t_star = None
+			parents = self._select_parents()
+			improvement = dict.fromkeys(parents, -np.inf)
 
 			# search for the next best basis functions
-			# generator returns new candidate pairs B_M and B_M+1
-			for B_M, B_M1, v, t, m in self._candidate_basis_generator(M, x):
-				# add candidate basis functions to the model and copmute lof
-				basis = np.append(self.basis_functions[:M - 1], [B_M, B_M1])
-				# compute lack-of-fit of model
-				lof = self.LOF(basis, x, y)
-				if lof < lof_star:
-					lof_star = lof
+			# пара выбирается по наибольшему уменьшению RSS, как у Фридмана, и при lof='gcv': ранг базиса может
+			# вырасти на 1 или на 2 (отражённый hinge бывает коллинеарен имеющимся термам), поэтому порядок пар
+			# по GCV может отличаться; GCV используется в правилах остановки и в backward pass
+			pairs = list(self._candidate_basis_generator(parents))
+			for (m, v), (reduction, t, n_knots) in zip(pairs, sweep_pairs(pairs)):
+				evaluations += n_knots
+				improvement[m] = max(improvement[m], reduction)
+				if reduction > reduction_star:
+					reduction_star = reduction
 					m_star = m
 					v_star = v
 					t_star = t
 
+			for m in range(len(self.terms)):
+				self.__parent_age[m] += 1
+			for m, value in improvement.items():
+				self.__parent_improvement[m] = value
+				self.__parent_age[m] = 0
+
+			if m_star is None:
+				self.stop_reason = 'no_candidates'  # все предикторы исчерпаны
+				break
+
 			print(f"added B[{M - 1}] = [x{v_star} - {t_star}]_+")
 			print(f"added B[{M}] = [-(x{v_star} - {t_star})]_+")
-			self.basis_functions[M - 1] = self.basis_functions[m_star] * mars_spline.hinge(v_star, t_star, 1)
-			self.basis_functions[M] = self.basis_functions[m_star] * mars_spline.hinge(v_star, t_star, -1)
-			self.__used_predictors[M - 1].add(m_star)
-			self.__used_predictors[M].add(m_star)
+			self.__add_term(m_star, v_star, t_star, 1)
+			self.__add_term(m_star, v_star, t_star, -1)
+			add_pair(m_star, v_star, t_star)
 			M += 2
+		else:
+			self.stop_reason = 'M_max'
+
+	def _blocks(self, x, y, sample_weight=None):
+		"""
+		Блоки обучающих данных для out-of-core обучения.
+		Args:
+			x: Массив или np.memmap (N×P), либо функция без аргументов, возвращающая новый итератор
+				блоков (x_chunk, y_chunk) или (x_chunk, y_chunk, weight_chunk) — данные читаются несколько раз
+			y: Отклики (для массива x)
+			sample_weight: Веса наблюдений (для массива x)
+		Yields:
+			tuple: Блок x (n×P, тип self.dtype), блок √w·y (n×k, float64) и √w (n×1)
+		"""
+		if callable(x):
+			chunks = x()
+		else:
+			size = self.chunk_size or 65536
+			chunks = ((x[start:start + size], y[start:start + size],
+					   None if sample_weight is None else sample_weight[start:start + size])
+					  for start in range(0, len(x), size))
+		for chunk in chunks:
+			x_chunk, y_chunk = chunk[0], chunk[1]
+			weight = chunk[2] if len(chunk) > 2 else None
+			self._response_ndim = np.ndim(y_chunk)  # до приведения к n×k: нужен для формы коэффициентов
+			x_chunk = np.asarray(x_chunk, dtype=self.dtype)
+			x_chunk = x_chunk.reshape(-1, 1) if x_chunk.ndim == 1 else x_chunk
+			root = np.ones((len(x_chunk), 1)) if weight is None else \
+				np.sqrt(np.asarray(weight, dtype=np.float64)).reshape(-1, 1)
+			yield x_chunk, root * np.asarray(y_chunk, dtype=np.float64).reshape(len(x_chunk), -1), root
+
+	def __scan_blocks(self, x, y, sample_weight, max_sample=200000):
+		"""
+		Первый проход по блокам: число наблюдений, полная сумма квадратов, максимумы предикторов
+		и выборка строк, по квантилям которой выбираются точки разреза.
+		Выборка равномерная без возвращения (резервуар по случайным ключам): хранится не более
+		max_sample скопированных строк, независимо от N.
+		"""
+		N, weight_sum, y_sum, y_sq, maxima = 0, 0.0, 0.0, 0.0, None
+		rng = np.random.default_rng(0)
+		sample, keys = None, np.empty(0)
+		for x_chunk, y_chunk, root in self._blocks(x, y, sample_weight):
+			N += len(x_chunk)
+			weight_sum += np.sum(root ** 2)
+			y_sum = y_sum + np.sum(root * y_chunk, axis=0)
+			y_sq = y_sq + np.sum(y_chunk ** 2, axis=0)
+			chunk_max = x_chunk.max(axis=0)
+			maxima = chunk_max if maxima is None else np.maximum(maxima, chunk_max)
+
+			# Строки с max_sample наименьшими ключами; индексирование копирует их из блока
+			chunk_keys = rng.random(len(x_chunk))
+			if len(keys) == max_sample:
+				take = np.flatnonzero(chunk_keys < keys.max())
+			else:
+				take = np.arange(len(x_chunk))
+			chunk_sample = x_chunk[take]
+			sample = chunk_sample if sample is None else np.concatenate([sample, chunk_sample])
+			keys = np.concatenate([keys, chunk_keys[take]])
+			if len(keys) > max_sample:
+				keep = np.argpartition(keys, max_sample - 1)[:max_sample]
+				sample, keys = sample[keep], keys[keep]
+		if not N:
+			raise ValueError("No training data")
+
+		n_knots = self.max_candidates or 100
+		levels = np.linspace(0, 1, n_knots + 2)[1:-1]
+		knots = [np.unique(np.quantile(sample[:, v], levels, method='inverted_cdf')) for v in range(sample.shape[1])]
+		tss = np.sum(y_sq - y_sum ** 2 / weight_sum)
+		return N, tss, maxima, knots
+
+	def __cross_products(self, x, y, sample_weight):
+		"""
+		Проход по блокам: BᵀB, Bᵀy и сумма квадратов y для текущей таблицы термов (с весами √w).
+		"""
+		M = len(self.terms)
+		gram, By, yy = np.zeros((M, M)), 0.0, 0.0
+		for x_chunk, y_chunk, root in self._blocks(x, y, sample_weight):
+			B = root * self._evaluate_terms(self.terms, x_chunk, self.dtype)
+			gram += B.T @ B
+			By = By + B.T @ y_chunk
+			yy += np.sum(y_chunk ** 2)
+		return gram, By, yy
+
+	@staticmethod
+	def _gram_basis(gram):
+		"""
+		Преобразование W, для которого Q = B·W ортонормирован (по спектру BᵀB; малые собственные
+		значения — линейно зависимые столбцы — отбрасываются).
+		Returns:
+			np.ndarray: W (M×rank)
+		"""
+		eigenvalues, vectors = np.linalg.eigh(gram)
+		keep = eigenvalues > 1e-12 * eigenvalues[-1]
+		return vectors[:, keep] / np.sqrt(eigenvalues[keep])
+
+	def __forward_blocks(self, x, y, sample_weight, N, tss, maxima, knots):
+		"""
+		Forward pass по блокам. На каждом шаге два прохода: перекрёстные произведения текущей модели
+		и суммы по интервалам между точками разреза для всех пар (m, v) — память O(пары · T · M), не O(N).
+		"""
+		state = {}
+
+		def evaluate_model():
+			gram, By, yy = self.__cross_products(x, y, sample_weight)
+			W = self._gram_basis(gram)
+			state['W'] = W
+			state['beta'] = W @ (W.T @ By)
+			return max(yy - np.sum(state['beta'] * By), 0.0), W.shape[1]
+
+		def sweep_pairs(pairs):
+			M, W, beta = len(self.terms), state['W'], state['beta']
+			k = beta.shape[1]
+			by_variable = {}
+			for m, v in pairs:
+				by_variable.setdefault(v, []).append(m)
+			# Столбцы сумм: w·B (M), u·B (M), w², w²·x, w²·x², w·r (k), u·r (k), число наблюдений на носителе
+			stats = {pair: np.zeros((len(knots[pair[1]]) + 1, 2 * M + 4 + 2 * k)) for pair in pairs}
+			for x_chunk, y_chunk, root in self._blocks(x, y, sample_weight):
+				B = root.astype(self.dtype) * self._evaluate_terms(self.terms, x_chunk, self.dtype)
+				r = y_chunk - B @ beta
+				for v, parents in by_variable.items():
+					column = x_chunk[:, v]
+					bins = np.searchsorted(knots[v], column, side='left')  # число точек разреза < x
+					H = csr_matrix((np.ones(len(column)), (bins, np.arange(len(column)))),
+								   shape=(len(knots[v]) + 1, len(column)))
+					for m in parents:
+						w = B[:, m].astype(np.float64)
+						if not w.any():
+							continue
+						u = w * column
+						features = np.column_stack([w[:, None] * B, u[:, None] * B, w * w, w * u, u * u,
+													w[:, None] * r, u[:, None] * r, w > 0])
+						stats[(m, v)] += H @ features
+
+			results = []
+			for m, v in pairs:
+				S = stats[(m, v)]
+				total = S.sum(axis=0)
+				if total[2 * M] <= 0:
+					results.append((-np.inf, None, 0))
+					continue
+				# Наблюдения с x > t_i лежат в интервалах i + 1, i + 2, ...
+				selected = self.__thin_knots(np.cumsum(S[:-1, -1]), total[-1])
+				suffix = np.cumsum(S[::-1], axis=0)[::-1][1:][selected]
+				s0, s1, s2 = suffix[:, 2 * M], suffix[:, 2 * M + 1], suffix[:, 2 * M + 2]
+				reduction, t = self._score_knots(
+					knots[v][selected], suffix[:, M:2 * M] @ W, suffix[:, :M] @ W, s0, s1, s2,
+					suffix[:, 2 * M + 3 + k:-1], suffix[:, 2 * M + 3:2 * M + 3 + k], total[M:2 * M] @ W,
+					total[2 * M + 2], total[2 * M + 3 + k:-1])
+				results.append((reduction, maxima[v] if t is None else t, max(len(selected), 1)))
+			return results
+
+		self.__grow(evaluate_model, sweep_pairs, lambda m, v, t: None, N, tss)
+
+	def __thin_knots(self, below, n):
+		"""
+		endspan и minspan для общих точек разреза по числу наблюдений носителя родителя в интервалах
+		между ними (аналог _knot_candidates с точностью до интервала).
+		Args:
+			below (np.ndarray): Число наблюдений носителя с x <= t_i для каждой точки разреза
+			n (float): Число наблюдений на носителе родителя
+		Returns:
+			np.ndarray: Индексы оставленных точек разреза
+		"""
+		endspan, minspan = self._spans(max(int(n), 1))
+		valid = np.flatnonzero((below >= endspan + 1) & (n - below >= endspan))
+		selected, last = [], -np.inf
+		for i in valid:
+			if below[i] - last >= minspan:
+				selected.append(i)
+				last = below[i]
+		return np.array(selected, dtype=int)
+
+	def __fit_blocks(self, x, y, sample_weight):
+		"""
+		Out-of-core обучение: данные читаются блоками, в памяти держатся только суммы
+		размера, зависящего от числа термов и точек разреза.
+		"""
+		N, tss, maxima, knots = self.__scan_blocks(x, y, sample_weight)
+		self.__forward_blocks(x, y, sample_weight, N, tss, maxima, knots)
+
+		gram, By, yy = self.__cross_products(x, y, sample_weight)
+		if self.__with_pruning:
+			self._backward_pass_gram(gram, By, yy, N)
+		else:
+			self.active = np.arange(len(self.terms))
+
+		active = self.active
+		self.coefficients = np.linalg.lstsq(gram[np.ix_(active, active)], By[active], rcond=None)[0]
+		# Суммы по блокам всегда (M×k); для одного отклика форма коэффициентов как при обучении в памяти
+		if self._response_ndim == 1:
+			self.coefficients = self.coefficients[:, 0]
+
+	def _stop_reason(self, rss, tss, lof, lof_previous, elapsed, evaluations):
+		"""
+		Проверка правил ранней остановки forward pass.
+		Args:
+			rss (float): RSS текущей модели
+			tss (float): Полная сумма квадратов отклонений y от среднего
+			lof (float): LOF текущей модели
+			lof_previous (float): LOF модели на предыдущем шаге
+			elapsed (float): Время с начала forward pass в секундах
+			evaluations (int): Число оценённых точек разреза
+		Returns:
+			str | None: Причина остановки или None, если рост модели продолжается
+		"""
+		if self.min_improvement is not None and np.isfinite(lof_previous) \
+				and lof > (1 - self.min_improvement) * lof_previous:
+			return 'min_improvement'
+		if self.max_r2 is not None and tss > 0 and 1 - rss / tss >= self.max_r2:
+			return 'max_r2'
+		if self.max_time is not None and elapsed >= self.max_time:
+			return 'max_time'
+		if self.max_evaluations is not None and evaluations >= self.max_evaluations:
+			return 'max_evaluations'
+		return None
 
-	def backward_pass(self, x, y):
+	def backward_pass(self, B, y):
 		"""
 		Backward pass of the MARS algorithm.
+
+		Базис факторизуется один раз (QR), A = (BᵀB)⁻¹ = R⁻¹R⁻ᵀ. Удаление терма j увеличивает RSS на
+		β_j² / A_jj, после чего A и β пересчитываются понижением ранга за O(M²), без новых регрессий.
+		Термы, линейно зависимые от предыдущих, удаляются первыми: RSS от этого не меняется.
 		Args:
-			x (array-like): Данные независимых переменных
+			B (np.ndarray): Матрица базиса всех термов после forward pass
 			y (array-like): Данные зависимой переменной
 		"""
-		M_max = len(self.basis_functions)  # number of basis functions
-		J_star = set(range(1, M_max + 1))  # {1,2,...,M_max}
-		K_star = J_star.copy()
-		lof_star = np.inf
-
-		for M in range(M_max, 1, -1):  # M_max, M_max-1, M_max-2, ..., 2
-			b = np.inf
-			L = K_star.copy()
-			for m in range(2, M + 1):
-				K = L.copy()
-				K.discard(m)  # trying to remove m-th Basis Function
-
-				indices = sorted(i - 1 for i in K)
-				remaining_basis = self.basis_functions[indices]
-				lof = self.LOF(remaining_basis, x, y)
-				if lof <= b:
-					b = lof
-					K_star = K
-				if lof <= lof_star:
-					lof_star = lof
-					J_star = K
-
-		# print(f"M_max: {M_max}; J_star: {J_star}; K_star: {K_star}")
-		indices = sorted(i - 1 for i in J_star)
-		self.basis_functions = self.basis_functions[indices]
+		y = y.reshape(len(y), -1)
+		N, M_max = B.shape  # number of basis functions
+		# При N < M_max у R только N строк: столбцы сверх них заведомо зависимы (диагональ дополняется нулями)
+		diagonal = np.zeros(M_max)
+		R = qr(B, mode='r')[0]
+		diagonal[:min(N, M_max)] = np.abs(np.diag(R))
+		dependent = diagonal <= 1e-9 * np.linalg.norm(B, axis=0)
+		dependent[0] = False
+
+		independent = np.flatnonzero(~dependent)
+		R = qr(B[:, independent], mode='r')[0][:len(independent)]
+		R_inv = solve_triangular(R, np.eye(len(independent)))
+		A = R_inv @ R_inv.T
+		beta = A @ (B[:, independent].T @ y)
+		rss = np.sum((y - B[:, independent] @ beta) ** 2)
+		self.__prune(A, beta, rss, dependent, N)
+
+	def _backward_pass_gram(self, gram, By, yy, N):
+		"""
+		Backward pass по накопленным перекрёстным произведениям (для обучения по блокам).
+		Линейно зависимые термы находятся по ходу разложения Холецкого матрицы Грама.
+		Args:
+			gram (np.ndarray): BᵀB (M×M)
+			By (np.ndarray): Bᵀy (M×k)
+			yy (float): Сумма квадратов y
+			N (int): Число наблюдений
+		"""
+		M_max = len(gram)
+		dependent = np.zeros(M_max, dtype=bool)
+		L = np.zeros((M_max, M_max))
+		independent = []
+		for j in range(M_max):
+			# Холецкий с пропуском столбцов, зависимых от уже принятых
+			l = solve_triangular(L[np.ix_(independent, independent)], gram[independent, j], lower=True) \
+				if independent else np.zeros(0)
+			pivot = gram[j, j] - l @ l
+			if j > 0 and pivot <= 1e-10 * gram[j, j]:
+				dependent[j] = True
+				continue
+			L[j, independent] = l
+			L[j, j] = np.sqrt(pivot)
+			independent.append(j)
+
+		L_inv = solve_triangular(L[np.ix_(independent, independent)], np.eye(len(independent)), lower=True)
+		A = L_inv.T @ L_inv
+		beta = A @ By[independent]
+		rss = max(yy - np.sum(beta * By[independent]), 0.0)
+		self.__prune(A, beta, rss, dependent, N)
+
+	def __prune(self, A, beta, rss, dependent, N):
+		"""
+		Пошаговое удаление термов понижением ранга.
+		Args:
+			A (np.ndarray): (BᵀB)⁻¹ по линейно независимым термам
+			beta (np.ndarray): Коэффициенты регрессии по ним
+			rss (float): RSS полной модели
+			dependent (np.ndarray): Маска линейно зависимых термов
+			N (int): Число наблюдений
+		"""
+		K = list(range(len(dependent)))  # текущий набор термов, K[0] = 0 — константа
+		rank = len(A)  # ранг базиса — след проекционной матрицы, нужен для GCV
+		J_star = K.copy()
+		lof_star = self.LOF(rss, N, len(K), rank)
+		for j in reversed(np.flatnonzero(dependent)):
+			K.remove(j)
+			lof = self.LOF(rss, N, len(K), rank)
+			if lof <= lof_star:
+				lof_star = lof
+				J_star = K.copy()
+
+		while len(K) > 1:
+			# Увеличение RSS при удалении каждого неконстантного терма
+			increase = np.sum(beta[1:] ** 2, axis=1) / np.diag(A)[1:]
+			j = 1 + len(increase) - 1 - np.argmin(increase[::-1])  # при равенстве — последний, как в переборе
+			rss += increase[j - 1]
+
+			# Понижение ранга: A ← A - a aᵀ / a_j, β ← β - a β_j / a_j без строки и столбца j
+			a = A[:, j]
+			A = A - np.outer(a, a) / a[j]
+			beta = beta - np.outer(a, beta[j]) / a[j]
+			keep = np.arange(len(K)) != j
+			A, beta = A[np.ix_(keep, keep)], beta[keep]
+			del K[j]
+			rank -= 1
+
+			lof = self.LOF(rss, N, len(K), rank)
+			if lof <= lof_star:
+				lof_star = lof
+				J_star = K.copy()
+
+		self.active = np.array(J_star)
 
 	@staticmethod
-	def least_squares(basis_funcs, x, y):
+	def least_squares(B, y):
 		"""
 		Вычисляет коэффициенты базисных функций методом наименьших квадратов.
 		Args:
-			basis_funcs (list): Список базисных функций
-			x (array-like): Данные независимых переменных
+			B (np.ndarray): Матрица базиса (N×M)
 			y (array-like): Данные зависимой переменной
 		Returns:
-			tuple: Кортеж из матрицы базисных функций B и вектора коэффициентов
+			np.ndarray: Вектор коэффициентов
 		"""
-		B = np.array([[f(row) for f in basis_funcs] for row in x], dtype=float)
 		coefficents, _, _, _ = np.linalg.lstsq(B, y, rcond=None)
-		return (B, coefficents)
+		return coefficents
 
-	def LOF_RSS(self, basis_funcs, x, y):
+	def LOF_RSS(self, rss, N, n_terms, rank):
 		"""
 		Residual Sum of Squares (RSS) for the given basis functions.
 		Args:
-			basis_funcs (list): Список базисных функций
-			x (array-like): Данные независимых переменных
-			y (array-like): Данные зависимой переменной
+			rss (float): Сумма квадратов остатков модели
+			N (int): Число наблюдений
+			n_terms (int): Число базисных функций (с константой)
+			rank (int): Ранг матрицы базиса
 		Returns:
 			float: Значение RSS
 		"""
-		B, coeff = mars_spline.least_squares(basis_funcs, x, y)
-		y_pred = B @ coeff
-		rss = np.sum((y - y_pred) ** 2)
 		return rss
 
-	def LOF_GCV(self, basis_funcs, x, y):
+	def LOF_GCV(self, rss, N, n_terms, rank):
 		"""
 		Generalized Cross-Validation (GCV) for the given basis functions.
 		Args:
-			basis_funcs (list): Список базисных функций
-			x (array-like): Данные независимых переменных
-			y (array-like): Данные зависимой переменной
+			rss (float): Сумма квадратов остатков модели
+			N (int): Число наблюдений
+			n_terms (int): Число базисных функций (с константой)
+			rank (int): Ранг матрицы базиса
 		Returns:
 			float: Значение GCV
 		"""
 		# MSE / (1 - Complexity(M)/N)^2
-		B, coeff = mars_spline.least_squares(basis_funcs, x, y)
-		y_pred = B @ coeff
-		mse = np.mean((y - y_pred) ** 2)
-		N = len(y)
-		C = self._complexity(basis_funcs[1:], x, self.d)  # only non-constant basis functions
+		mse = rss / N
+		C = self._complexity(rank, n_terms, self.d)
 		return mse / ((1 - C / N) ** 2)
 
-	def _complexity(self, basis, x, d=3):
+	def _complexity(self, rank, n_terms, d=3):
 		"""
 		Вычисляет сложность модели, основанную на количестве базисных функций и их проекции.
+		След проекционной матрицы B(BᵀB)⁺Bᵀ равен рангу B, поэтому сама матрица N×N не строится:
+		ранг берётся из факторизации, уже выполненной при регрессии.
 		Args:
-			basis (list): Список базисных функций
-			x (array-like): Данные независимых переменных
+			rank (int): Ранг матрицы базиса (с константой)
+			n_terms (int): Число базисных функций (с константой)
 			d (int): Параметр сглаживания, по умолчанию 3
 		Returns:
 			float: Значение сложности модели
 		"""
-		# B_ij = (B_i(x_j)), x_j - j-th observation of predictor set x (j-th row in matrix x)
-		B = np.array([[f(row) for row in x] for f in basis], dtype=float)
-		BTB_inv = np.linalg.pinv(B.T @ B)
-		projection = B @ BTB_inv @ B.T
-		return np.trace(projection) + 1 + d * len(basis)
+		return rank + d * (n_terms - 1)
 
-	def fit(self, x: np.ndarray, y: np.ndarray) -> None:
+	def fit(self, x: np.ndarray, y: np.ndarray = None, sample_weight=None) -> None:
 		"""
 		Обучение сплайна на данных
 		Args:
-			x (array-like): Данные независимых переменных
-			y (array-like): Данные зависимой переменной
-		"""
+			x (array-like): Данные независимых переменных. np.memmap (или любой x при заданном chunk_size)
+				читается блоками; также можно передать функцию без аргументов, возвращающую новый
+				итератор блоков (x_chunk, y_chunk) или (x_chunk, y_chunk, weight_chunk), тогда y не нужен.
+			y (array-like): Данные зависимой переменной (N,) или несколько откликов (N×k). Для нескольких
+				откликов строится один общий базис, LOF суммируется по откликам, коэффициенты — (M×k).
+			sample_weight (array-like, optional): Неотрицательные веса наблюдений (N,)
+		"""
+		if sample_weight is not None and not callable(x):
+			sample_weight = np.asarray(sample_weight, dtype=float) if not isinstance(sample_weight, np.memmap) \
+				else sample_weight
+			if sample_weight.shape != (len(x),):
+				raise ValueError(f"sample_weight must have shape ({len(x)},), got {sample_weight.shape}")
+			if not isinstance(sample_weight, np.memmap) and np.any(sample_weight < 0):
+				raise ValueError("sample_weight must be non-negative")
+
+		self.__reset_terms()
+		if callable(x) or isinstance(x, np.memmap) or self.chunk_size is not None:
+			self.__fit_blocks(x, y, sample_weight)
+			self.basis_functions = [mars_spline.basis_function(self.terms, j) for j in self.active]
+			return
+
+		x = self._as_matrix(x)
+		y = np.asarray(y, dtype=float)
 
 		# Add basis functions during forward_pass
-		self.forward_pass(x, y)
+		B = self.forward_pass(x, y, sample_weight)
+		if sample_weight is not None:
+			y = (np.sqrt(sample_weight) * y.T).T  # B из forward_pass уже взвешен
 
 		# Prune model during backward pass
 		if self.__with_pruning:
-			self.backward_pass(x, y)
+			self.backward_pass(B, y)
+		else:
+			self.active = np.arange(B.shape[1])
 
 		# Compute coefficients
-		_, self.coefficients = mars_spline.least_squares(self.basis_functions, x, y)
+		self.coefficients = mars_spline.least_squares(B[:, self.active], y)
+		self.basis_functions = [mars_spline.basis_function(self.terms, j) for j in self.active]
 
 	def predict(self, x: np.ndarray) -> np.ndarray:
 		"""
@@ -2160,12 +3594,13 @@ class mars_spline(Spline):
 		if self.coefficients is None:
 			raise ValueError("Spline not fitted yet")
 
-		x = np.asarray(x)
-		if x.ndim == 1:
-			x = x.reshape(-1, 1)
-
-		B = np.array([[f(row) for f in self.basis_functions] for row in x], dtype=float)
-		return B @ self.coefficients
+		blocks = [x]
+		if isinstance(x, np.memmap) or self.chunk_size is not None:
+			# По блокам: память под базис ограничена размером блока, а не N
+			size = self.chunk_size or 65536
+			blocks = [x[start:start + size] for start in range(0, len(x), size)] or [x]
+		return np.concatenate([self._evaluate_terms(self.terms, self._as_matrix(block), self.dtype)[:, self.active]
+							   @ self.coefficients for block in blocks])
 
 	def get_basis_functions(self) -> List[Callable]:
 		"""
@@ -2175,18 +3610,54 @@ class mars_spline(Spline):
 		"""
 		return self.basis_functions
 
+	def export(self, path=None):
+		"""
+		Компактное описание обученной модели: активные термы и их предки (с перенумерованными родителями)
+		и коэффициенты. Загружается в mars_spline.evaluator без повторного обучения.
+		Args:
+			path (str, optional): Файл для сохранения; формат по расширению — .json или .npz
+		Returns:
+			dict: Поля таблицы термов (parent, variable, knot, sign), active, coefficients и version
+		"""
+		if self.coefficients is None:
+			raise ValueError("Spline not fitted yet")
+
+		needed = set()
+		for j in self.active:
+			while j >= 0 and j not in needed:
+				needed.add(j)
+				j = self.terms[j]['parent']
+		kept = np.array(sorted(needed))
+		index = np.full(len(self.terms), -1)
+		index[kept] = np.arange(len(kept))
+		terms = self.terms[kept].copy()
+		terms['parent'] = np.where(terms['parent'] >= 0, index[terms['parent']], -1)
+
+		model = {field: terms[field] for field in mars_spline.TERM_DTYPE.names}
+		model.update(active=index[self.active], coefficients=np.asarray(self.coefficients),
+					 version=mars_spline.EXPORT_VERSION)
+		if path is not None:
+			if str(path).endswith('.json'):
+				with open(path, 'w', encoding='utf-8') as f:
+					json.dump({key: np.asarray(value).tolist() for key, value in model.items()}, f)
+			elif str(path).endswith('.npz'):
+				np.savez(path, **model)
+			else:
+				raise ValueError(f"Unsupported export format: {path}. Use .json or .npz.")
+		return model
+
 	@staticmethod
-	def hinge(index, knot, sign):
+	def hinge(column, knot, sign):
 		"""
-		Создает базисную функцию в виде f(x) = sign * (x[index] - knot)⁺
+		Вычисляет hinge-множитель f(x) = max(0, sign * (x - knot)) для столбца предиктора
 		Args:
-			index (int): Индекс предиктора, для которого создается базисная функция
+			column (np.ndarray): Значения предиктора
 			knot (float): Точка разреза функции
 			sign (int): Знак функции (1 или -1)
 		Returns:
-			Callable: Базисная функция, которая принимает массив x и возвращает значения функции
+			np.ndarray: Значения функции
 		"""
-		return mars_spline.basis_function(lambda x: max(0, sign * (x[index] - knot)))
+		return np.maximum(0.0, sign * (column - knot))
 
 	@staticmethod
 	def demo(M_max):
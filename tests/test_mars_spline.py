@@ -0,0 +1,17 @@
+import numpy as np
+
+from code_interfaces.splines import mars_spline
+
+
+def test_fit_with_fewer_samples_than_terms():
+	# N < M_max: у R из QR только N строк, лишние столбцы базиса должны считаться зависимыми
+	rng = np.random.default_rng(0)
+	x = rng.random((8, 2))
+	y = np.sin(3 * x[:, 0]) + x[:, 1]
+
+	for lof in ('gcv', 'rss'):
+		spline = mars_spline(15, x, y, lof=lof)
+		spline.fit(x, y)
+		prediction = spline.predict(x)
+		assert prediction.shape == (8,)
+		assert np.all(np.isfinite(prediction))